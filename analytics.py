@@ -0,0 +1,270 @@
+"""
+Vectorised trend analytics over every user at once.
+
+Usage:
+    python analytics.py
+    python analytics.py --window 7 --velocity-days 28 --csv report.csv
+
+daily_logs and growth are loaded once into NumPy column arrays sorted by
+user and date (LogArrays). Every statistic is then computed for the
+whole population with array operations rather than per-user loops:
+
+- moving averages of sleep hours and feed volume over each user's last
+  'window' days of logs;
+- growth velocity: the least-squares slope of weight (kg/week) and
+  height (cm/month) over each user's latest measurements;
+- diaper anomalies: days whose wet or dirty diaper count is more than
+  'threshold' standard deviations from that user's own mean.
+"""
+
+# Standard libraries
+import argparse
+import csv
+import time
+
+# Third party libraries
+import numpy as np
+from colorama import init, Fore, Style
+
+# Local modules
+from records import date_ordinal
+from storage import open_worksheets
+
+DEFAULT_WINDOW = 7
+DEFAULT_VELOCITY_DAYS = 28
+DEFAULT_THRESHOLD = 3.0
+# Users need this many logs before their counts are judged
+DEFAULT_MIN_LOGS = 14
+
+DAYS_PER_MONTH = 365.25 / 12
+
+# Numeric columns of each analysed worksheet, by column index
+DAILY_COLUMNS = {
+    2: "sleep_hours", 3: "feed_ml", 4: "wet_diapers", 5: "dirty_diapers"
+}
+GROWTH_COLUMNS = {2: "weight", 3: "height"}
+
+REPORT_HEADERS = [
+    "Username", "Avg Sleep (hrs)", "Avg Feed (ml)", "Weight Gain (kg/week)",
+    "Height Gain (cm/month)", "Diaper Anomalies"
+]
+
+
+def _ordinal(value):
+    try:
+        return date_ordinal(value.strip())
+    except ValueError:
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+class LogArrays:
+    """
+    The rows of a log worksheet (header excluded) as arrays sorted by
+    user, then date. 'users' holds the distinct usernames, 'user' each
+    row's index into it, 'date' the date ordinals and 'values' one float
+    array per numeric column, with NaN for blank or invalid cells. Rows
+    without a username or a valid date are left out.
+    """
+
+    def __init__(self, rows, columns):
+        rows = [row for row in rows if len(row) >= 2 and row[0].strip()]
+        dates = [_ordinal(row[1]) for row in rows]
+        rows = [row for row, day in zip(rows, dates) if day is not None]
+        dates = np.array(
+            [day for day in dates if day is not None], dtype=np.int64
+        )
+        self.users, user = np.unique(
+            np.array([row[0].strip() for row in rows], dtype=str),
+            return_inverse=True
+        )
+        order = np.lexsort((dates, user))
+        self.user = user[order]
+        self.date = dates[order]
+        self.values = {}
+        for index, name in columns.items():
+            cells = np.array(
+                [_float(row[index]) if len(row) > index else np.nan
+                 for row in rows],
+                dtype=float
+            )
+            self.values[name] = cells[order]
+        self.counts = np.bincount(self.user, minlength=len(self.users))
+        # Index of each user's last row
+        self.last = np.cumsum(self.counts) - 1
+
+    def __len__(self):
+        return len(self.date)
+
+
+def moving_average(arrays, column, window=DEFAULT_WINDOW):
+    """
+    Returns, for every row, the mean of the column over that user's logs
+    dated within the 'window' days ending on the row's date. Blank cells
+    are ignored; NaN where the window has no values.
+    """
+    values = arrays.values[column]
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    # Rows are sorted by (user, date), so one sorted key finds each
+    # row's window start
+    key = arrays.user * (2 ** 32) + arrays.date
+    first = np.searchsorted(key, key - (window - 1), side="left")
+    last = np.arange(1, len(arrays) + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums[last] - sums[first]) / (counts[last] - counts[first])
+
+
+def growth_velocity(arrays, column, days=DEFAULT_VELOCITY_DAYS,
+                    per_days=7):
+    """
+    Returns each user's rate of change of the column per 'per_days'
+    days: the least-squares slope over their measurements from the
+    'days' days up to their latest one. NaN for users with fewer than
+    two measurements on different dates in that span.
+    """
+    values = arrays.values[column]
+    latest = arrays.date[arrays.last][arrays.user]
+    # Days before the user's latest measurement
+    x = (arrays.date - latest).astype(float)
+    used = (x > -days) & ~np.isnan(values)
+    user = arrays.user[used]
+    x = x[used]
+    y = values[used]
+    size = len(arrays.users)
+    n = np.bincount(user, minlength=size)
+    sum_x = np.bincount(user, x, size)
+    sum_y = np.bincount(user, y, size)
+    sum_xx = np.bincount(user, x * x, size)
+    sum_xy = np.bincount(user, x * y, size)
+    spread = n * sum_xx - sum_x * sum_x
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sum_xy - sum_x * sum_y) / spread
+    slope[(n < 2) | (spread <= 0)] = np.nan
+    return slope * per_days
+
+
+def diaper_anomalies(arrays, column, threshold=DEFAULT_THRESHOLD,
+                     min_logs=DEFAULT_MIN_LOGS):
+    """
+    Returns a boolean array marking the rows whose count is more than
+    'threshold' standard deviations from that user's mean count. Users
+    with fewer than 'min_logs' counts are not judged.
+    """
+    values = arrays.values[column]
+    present = ~np.isnan(values)
+    size = len(arrays.users)
+    filled = np.where(present, values, 0)
+    n = np.bincount(arrays.user, present, size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(arrays.user, filled, size) / n
+        variance = np.bincount(arrays.user, filled * filled, size) / n
+        std = np.sqrt(np.maximum(variance - mean * mean, 0))
+        z = (values - mean[arrays.user]) / std[arrays.user]
+    judged = (n >= min_logs) & (std > 0)
+    return present & judged[arrays.user] & (np.abs(z) > threshold)
+
+
+def _per_user(users, arrays, values):
+    # Spread per-user values of 'arrays' over the report's user list
+    result = np.full(len(users), np.nan)
+    if len(arrays.users):
+        result[np.searchsorted(users, arrays.users)] = values
+    return result
+
+
+def population_report(daily, growth, window=DEFAULT_WINDOW,
+                      velocity_days=DEFAULT_VELOCITY_DAYS,
+                      threshold=DEFAULT_THRESHOLD):
+    """
+    Returns one REPORT_HEADERS row per user of either worksheet, sorted
+    by username: the sleep and feed averages over their last 'window'
+    days of logs, their weight and height velocity, and their number of
+    anomalous diaper counts. Unknown values are blank.
+    """
+    users = np.union1d(daily.users, growth.users)
+    columns = []
+    for column in ("sleep_hours", "feed_ml"):
+        averages = moving_average(daily, column, window)
+        columns.append(_per_user(users, daily, averages[daily.last]))
+    columns.append(_per_user(
+        users, growth, growth_velocity(growth, "weight", velocity_days, 7)
+    ))
+    columns.append(_per_user(
+        users, growth,
+        growth_velocity(growth, "height", velocity_days, DAYS_PER_MONTH)
+    ))
+    anomalies = (
+        diaper_anomalies(daily, "wet_diapers", threshold)
+        | diaper_anomalies(daily, "dirty_diapers", threshold)
+    )
+    counts = np.bincount(daily.user, anomalies, len(daily.users))
+    columns.append(np.nan_to_num(_per_user(users, daily, counts)))
+
+    report = []
+    for index, username in enumerate(users.tolist()):
+        row = [username]
+        for values in columns[:-1]:
+            value = values[index]
+            row.append("" if np.isnan(value) else round(float(value), 2))
+        row.append(int(columns[-1][index]))
+        report.append(row)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report sleep, feeding and growth trends of all users."
+    )
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW)
+    parser.add_argument(
+        "--velocity-days", type=int, default=DEFAULT_VELOCITY_DAYS
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD
+    )
+    parser.add_argument("--csv", help="write the report to this file")
+    args = parser.parse_args()
+
+    init(autoreset=True)
+    worksheets = open_worksheets()
+    started = time.perf_counter()
+    daily = LogArrays(
+        worksheets['daily_logs'].get_all_values()[1:], DAILY_COLUMNS
+    )
+    growth = LogArrays(
+        worksheets['growth'].get_all_values()[1:], GROWTH_COLUMNS
+    )
+    loaded = time.perf_counter()
+    report = population_report(
+        daily, growth, args.window, args.velocity_days, args.threshold
+    )
+    finished = time.perf_counter()
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(REPORT_HEADERS)
+            writer.writerows(report)
+    else:
+        print(Fore.MAGENTA + " | ".join(REPORT_HEADERS) + Style.RESET_ALL)
+        for row in report:
+            print(" | ".join(str(value) for value in row))
+    print(
+        Fore.GREEN
+        + f"✅ Analysed {len(daily) + len(growth)} row(s) of "
+        + f"{len(report)} user(s): loaded in {loaded - started:.2f} s, "
+        + f"computed in {finished - loaded:.2f} s"
+        + Style.RESET_ALL
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Passwords and login sessions for Simple Baby Tracker.
+
+Passwords are never stored. The 'credentials' worksheet holds one row
+per user with a salted PBKDF2-SHA256 hash, encoded as
+
+    pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+
+CredentialStore keeps the hashes in memory keyed by username, so a
+password check is a dict lookup and one hash, with no sheet read.
+
+A successful login starts a session: a random token that stays valid
+while it is used at least every BABY_TRACKER_SESSION_TTL seconds
+(default 1800). Later actions check the token locally instead of looking
+the user up again.
+"""
+
+# Standard libraries
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+# Local modules
+from cache import TimedCache
+
+ALGORITHM = "pbkdf2_sha256"
+DEFAULT_ITERATIONS = 200000
+SALT_BYTES = 16
+
+# Default number of idle seconds before a session expires
+DEFAULT_SESSION_TTL = 1800
+
+
+def session_ttl():
+    return float(
+        os.environ.get('BABY_TRACKER_SESSION_TTL', DEFAULT_SESSION_TTL)
+    )
+
+
+def hash_password(password, salt=None, iterations=DEFAULT_ITERATIONS):
+    """
+    Returns the encoded salted hash of a password. A random salt is
+    drawn unless one is given.
+    """
+    salt = os.urandom(SALT_BYTES) if salt is None else salt
+    digest = hashlib.pbkdf2_hmac(
+        "sha256", password.encode("utf-8"), salt, iterations
+    )
+    return f"{ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def check_password(password, encoded):
+    """
+    Whether the password matches an encoded hash. Malformed hashes never
+    match.
+    """
+    try:
+        algorithm, iterations, salt, expected = encoded.split("$")
+        if algorithm != ALGORITHM:
+            return False
+        digest = hashlib.pbkdf2_hmac(
+            "sha256", password.encode("utf-8"), bytes.fromhex(salt),
+            int(iterations)
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+class CredentialStore(TimedCache):
+    """
+    Password hashes keyed by username, loaded from the credentials
+    worksheet once per TTL period. New passwords are added as they are
+    written. A username keeps the first hash saved for it.
+    """
+
+    def __init__(self, sheet, ttl=None):
+        super().__init__(sheet, ttl)
+        self.hashes = {}
+
+    def refresh(self):
+        hashes = {}
+        for row in self.sheet.get_all_values()[1:]:
+            if len(row) >= 2 and row[0]:
+                hashes.setdefault(row[0], row[1])
+        with self.lock:
+            # Hashes added by this process may not be saved yet
+            for username, encoded in self.hashes.items():
+                hashes.setdefault(username, encoded)
+            self.hashes = hashes
+            self.loaded_at = time.monotonic()
+
+    def get(self, username):
+        self.ensure_fresh()
+        return self.hashes.get(username)
+
+    def add_row(self, row):
+        # Remember a credentials row that is waiting to be saved
+        with self.lock:
+            self.hashes.setdefault(row[0], row[1])
+
+    def add(self, username, password):
+        """
+        Hashes a new user's password and returns the credentials row to
+        save, or None, leaving the store unchanged, if the user already
+        has a password.
+        """
+        encoded = hash_password(password)
+        with self.lock:
+            self.ensure_fresh()
+            if username in self.hashes:
+                return None
+            self.hashes[username] = encoded
+            return [username, encoded]
+
+    def verify(self, username, password):
+        encoded = self.get(username)
+        return encoded is not None and check_password(password, encoded)
+
+
+class SessionStore:
+    """
+    Login sessions keyed by random token. A session expires 'ttl'
+    seconds after its last use. Safe to use from several threads.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = session_ttl() if ttl is None else ttl
+        # token -> [username, expiry time]
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def start(self, username):
+        # Returns the token of a new session for the user
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self.lock:
+            # Forget sessions that have expired since the last login
+            for old in [
+                key for key, (_, expires) in self.sessions.items()
+                if expires < now
+            ]:
+                del self.sessions[old]
+            self.sessions[token] = [username, now + self.ttl]
+        return token
+
+    def user(self, token):
+        """
+        Returns the username of a live session, extending it, or None
+        for an unknown or expired token.
+        """
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None:
+                return None
+            if session[1] < now:
+                del self.sessions[token]
+                return None
+            session[1] = now + self.ttl
+            return session[0]
+
+    def end(self, token):
+        with self.lock:
+            self.sessions.pop(token, None)
@@ -0,0 +1,241 @@
+"""
+Benchmark of the app's main operations against a fake Google Sheet.
+
+run.py is pointed at an in-process FakeSpreadsheet (see fake_sheets.py)
+filled with generated users and logs, so no Google account is needed.
+Each operation is run on random users; its latency percentiles and the
+number of Sheets API calls it made and cells they returned are reported,
+optionally also as JSON for comparing runs.
+
+Operations: log_exists, verify_password, update_summary,
+display_user_summary, login (the steps main() runs after a returning
+user logs in), period_summary (the user's totals over the last 30 days)
+and save_log (a new daily log, written through the journal).
+
+Usage:
+    python benchmarks/bench_app.py --users 500 --iterations 200
+    python benchmarks/bench_app.py --latency 0.08 --quota 60 --rate 1 --cold
+"""
+
+# Standard libraries
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__
+))))
+
+# Local modules
+from fake_sheets import FakeSpreadsheet, generate_tracker_data  # noqa: E402
+
+# run.py journals new rows; keep the benchmark's journal out of the way
+os.environ.setdefault("BABY_TRACKER_JOURNAL", os.path.join(
+    tempfile.mkdtemp(prefix="bench_app_"), "bench.journal"
+))
+
+import run  # noqa: E402
+from storage import WORKSHEET_HEADERS  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, int(round(fraction * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def reset_caches():
+    # Forget every cached read, as at the start of a new session
+    caches = list(run.LOG_INDEXES.values()) + list(run.DATE_INDEXES.values())
+    caches += [run.USER_DIRECTORY, run.USER_DIRECTORY.row_numbers]
+    caches += [run.ROLLUPS, run.SUMMARY_ROWS, run.CREDENTIALS]
+    caches += [run.CONNECTION.get(title) for title in WORKSHEET_HEADERS]
+    for cache in caches:
+        cache.invalidate()
+    run.USER_DIRECTORY.users = {}
+    run.CREDENTIALS.hashes = {}
+    run.SUMMARY_ENGINE.computed_on = None
+
+
+def make_operations(users, rng):
+    """
+    Returns a dict of operation name to a function running it once on a
+    random user.
+    """
+    usernames = [row[0] for row in users]
+    # Passwords as set by fake_sheets.generate_tracker_data()
+    passwords = {row[0]: f"secret{row[0][len('parent'):]}" for row in users}
+    # New logs use dates long before any summary window
+    next_day = iter(range(10 ** 6))
+
+    def pick():
+        return rng.choice(usernames)
+
+    def log_exists():
+        log_date = date.today() - timedelta(days=rng.randint(0, 700))
+        run.log_exists(run.daily_logs, pick(), log_date.isoformat())
+
+    def verify_password():
+        username = pick()
+        run.verify_password(username, passwords[username])
+
+    def login():
+        username = pick()
+        run.is_username_taken(username)
+        run.prefetch_login(username)
+        run.show_user_profile(username)
+        run.update_summary(username)
+        run.display_user_summary(username)
+
+    def period_summary():
+        username = pick()
+        end = date.today().toordinal()
+        run.summarize_range(
+            username, run.DATE_INDEXES, end - 29, end,
+            run.USER_DIRECTORY.get(username)
+        )
+
+    def save_log():
+        log_date = date(1990, 1, 1) + timedelta(days=next(next_day))
+        run.append_log(
+            run.daily_logs, [pick(), log_date.isoformat(), 12.0, 700.0, 6, 3]
+        )
+        run.flush_writes()
+
+    return {
+        'log_exists': log_exists,
+        'verify_password': verify_password,
+        'update_summary': lambda: run.update_summary(pick()),
+        'display_user_summary': lambda: run.display_user_summary(pick()),
+        'login': login,
+        'period_summary': period_summary,
+        'save_log': save_log,
+    }
+
+
+def measure(operation, iterations, spreadsheet, cold):
+    """
+    Runs an operation 'iterations' times and returns its latencies in
+    seconds, the API calls it made, the calls per (worksheet, method)
+    and the cells the calls returned.
+    """
+    latencies = []
+    calls_before = spreadsheet.calls.copy()
+    cells_before = spreadsheet.cells.copy()
+    for _ in range(iterations):
+        if cold:
+            reset_caches()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            operation()
+        latencies.append(time.perf_counter() - started)
+    calls = spreadsheet.calls - calls_before
+    cells = spreadsheet.cells - cells_before
+    return sorted(latencies), sum(calls.values()), calls, sum(cells.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="mean simulated seconds per API call"
+    )
+    parser.add_argument(
+        "--quota", type=int, default=None,
+        help="simulated API calls allowed per minute"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0.0,
+        help="scheduler calls per second (0: no limit)"
+    )
+    parser.add_argument(
+        "--cold", action="store_true",
+        help="clear every cache before each operation"
+    )
+    parser.add_argument(
+        "--operations", nargs="+", default=None,
+        help="operations to run (default: all)"
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tables = generate_tracker_data(args.users, args.years, args.seed)
+    rows = sum(len(table) - 1 for table in tables.values())
+    print(f"Generated {args.users} users and {rows} rows")
+
+    os.environ["BABY_TRACKER_RATE"] = str(args.rate)
+    spreadsheet = FakeSpreadsheet(
+        tables, latency=args.latency, quota=args.quota, seed=args.seed
+    )
+    run.CONNECTION.opener = spreadsheet.open_worksheets
+    run.CONNECTION.start()
+    # Fill the summary sheet once, as a first login would
+    with contextlib.redirect_stdout(io.StringIO()):
+        run.update_summary(tables['user_info'][1][0])
+
+    operations = make_operations(
+        tables['user_info'][1:], random.Random(args.seed)
+    )
+    names = args.operations or list(operations)
+
+    results = []
+    print(
+        f"{'operation':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'max ms':>9}{'calls/op':>10}{'cells/op':>11}"
+    )
+    for name in names:
+        latencies, calls, by_method, cells = measure(
+            operations[name], args.iterations, spreadsheet, args.cold
+        )
+        result = {
+            "operation": name,
+            "iterations": args.iterations,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "api_calls": calls,
+            "api_calls_per_op": calls / args.iterations,
+            "cells_per_op": cells / args.iterations,
+            "calls_by_method": {
+                f"{title}.{method}": count
+                for (title, method), count in sorted(by_method.items())
+            },
+        }
+        results.append(result)
+        print(
+            f"{name:<22}{result['p50_ms']:9.2f}{result['p95_ms']:9.2f}"
+            f"{result['p99_ms']:9.2f}{result['max_ms']:9.2f}"
+            f"{result['api_calls_per_op']:10.2f}"
+            f"{result['cells_per_op']:11.0f}"
+        )
+    print(
+        f"throttled calls: {spreadsheet.throttled}, "
+        f"retries: {spreadsheet.scheduler.retries}, "
+        f"coalesced reads: {spreadsheet.scheduler.coalesced}"
+    )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({
+                "settings": vars(args),
+                "throttled": spreadsheet.throttled,
+                "retries": spreadsheet.scheduler.retries,
+                "coalesced": spreadsheet.scheduler.coalesced,
+                "results": results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Benchmark of the weekly summary aggregation.
+
+Compares the original per-user list-comprehension aggregation from
+update_summary() with the single pass over typed records: rows are
+converted once with records.load_records() and then aggregated by
+summarize_records(). The original approach scans every row once per
+user, so at full scale it is timed on a sample of users and extrapolated
+to the whole user base. The memory held per daily log row is reported
+for both representations.
+
+Usage:
+    python benchmarks/bench_summary.py --users 10000 --rows 1000000
+"""
+
+# Standard libraries
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__
+))))
+
+# Local modules
+from records import (  # noqa: E402
+    DailyLog, GrowthEntry, Milestone, load_records
+)
+from summary import summarize_records, window_start  # noqa: E402
+
+
+def generate_rows(users, rows, days=365, seed=1):
+    """
+    Returns (usernames, daily_rows, milestone_rows, growth_rows) with
+    'rows' log rows in total, split 70/15/15 between the three sheets.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    usernames = [f"user{i}" for i in range(users)]
+    dates = [str(today - timedelta(days=day)) for day in range(days)]
+
+    daily_rows = [
+        [
+            rng.choice(usernames), rng.choice(dates),
+            f"{rng.uniform(8, 16):.1f}", str(rng.randint(300, 1000)),
+            str(rng.randint(3, 10)), str(rng.randint(0, 6))
+        ]
+        for _ in range(rows * 70 // 100)
+    ]
+    milestone_rows = [
+        [
+            rng.choice(usernames), rng.choice(dates),
+            rng.choice(["None", "rolling", "first smile", "crawling"])
+        ]
+        for _ in range(rows * 15 // 100)
+    ]
+    growth_rows = [
+        [
+            rng.choice(usernames), rng.choice(dates),
+            f"{rng.uniform(3, 10):.2f}", f"{rng.uniform(48, 78):.1f}"
+        ]
+        for _ in range(rows - len(daily_rows) - len(milestone_rows))
+    ]
+    return usernames, daily_rows, milestone_rows, growth_rows
+
+
+def legacy_summary(usernames, daily_rows, milestone_rows, growth_rows):
+    """
+    The original update_summary() aggregation, without the sheet writes.
+    """
+    week_ago = datetime.today() - timedelta(days=7)
+    table = []
+    for username in usernames:
+        user_daily_logs = [row for row in daily_rows if row[0] == username]
+        recent_logs = [
+            row for row in user_daily_logs
+            if datetime.strptime(row[1], '%Y-%m-%d') >= week_ago
+        ]
+        total_sleep = sum(
+            float(row[2]) for row in recent_logs if row[2].strip()
+        )
+        total_feed = sum(
+            float(row[3]) for row in recent_logs if row[3].strip()
+        )
+        total_wet_diapers = sum(
+            int(row[4]) for row in recent_logs if row[4].strip()
+        )
+        total_dirty_diapers = sum(
+            int(row[5]) for row in recent_logs if row[5].strip()
+        )
+
+        user_milestones = [
+            row for row in milestone_rows if row[0] == username
+        ]
+        recent_milestones = [
+            row for row in user_milestones
+            if datetime.strptime(row[1], '%Y-%m-%d') >= week_ago
+            and row[2].strip().lower() != "none"
+            and row[2].strip() != ""
+        ]
+
+        user_growth = [row for row in growth_rows if row[0] == username]
+        if user_growth:
+            user_growth.sort(
+                key=lambda x: datetime.strptime(x[1], '%Y-%m-%d'),
+                reverse=True
+            )
+            latest_weight = user_growth[0][2]
+            latest_height = user_growth[0][3]
+        else:
+            latest_weight = ""
+            latest_height = ""
+
+        table.append([
+            username,
+            round(total_sleep, 2),
+            round(total_feed, 2),
+            len(recent_milestones),
+            latest_weight,
+            latest_height,
+            total_wet_diapers,
+            total_dirty_diapers
+        ])
+    return table
+
+
+def load_all(daily_rows, milestone_rows, growth_rows):
+    return (
+        load_records(DailyLog, daily_rows),
+        load_records(Milestone, milestone_rows),
+        load_records(GrowthEntry, growth_rows),
+    )
+
+
+def single_pass_summary(usernames, daily_logs, milestones, growth):
+    summaries = summarize_records(
+        usernames, daily_logs, milestones, growth, window_start()
+    )
+    return [summaries[username].as_row() for username in usernames]
+
+
+def bytes_per_row(build, count):
+    # Memory allocated by build(), divided by the number of rows
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size / count
+
+
+def normalized(table):
+    # Compare numbers by value, whether they are numbers or strings
+    def cell(value):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return [[cell(value) for value in row] for row in table]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument(
+        "--legacy-sample", type=int, default=20,
+        help="number of users the original aggregation is timed on"
+    )
+    args = parser.parse_args()
+
+    print(f"Generating {args.users} users and {args.rows} log rows...")
+    usernames, daily_rows, milestone_rows, growth_rows = generate_rows(
+        args.users, args.rows
+    )
+
+    started = time.perf_counter()
+    records = load_all(daily_rows, milestone_rows, growth_rows)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    new_table = single_pass_summary(usernames, *records)
+    new_seconds = time.perf_counter() - started
+
+    sample = usernames[:min(args.legacy_sample, args.users)]
+    started = time.perf_counter()
+    old_table = legacy_summary(
+        sample, daily_rows, milestone_rows, growth_rows
+    )
+    old_seconds = (
+        (time.perf_counter() - started) * args.users / len(sample)
+    )
+
+    # The original summary has no percentile columns, so compare the
+    # columns both produce
+    width = len(old_table[0]) if old_table else 0
+    if normalized(old_table) != normalized(
+        [row[:width] for row in new_table[:len(sample)]]
+    ):
+        print("WARNING: results differ between the two aggregations")
+
+    print(f"load records: {load_seconds:10.2f} s (once per load)")
+    print(f"single pass:  {new_seconds:10.2f} s")
+    print(
+        f"original:     {old_seconds:10.2f} s "
+        f"(extrapolated from {len(sample)} users)"
+    )
+    print(f"speed-up:     {old_seconds / new_seconds:10.1f}x")
+
+    # Copy a sample of rows so their strings are counted as well
+    count = min(100000, len(daily_rows))
+    sample_rows = [
+        ",".join(row).split(",") for row in daily_rows[:count]
+    ]
+    row_bytes = bytes_per_row(
+        lambda: [",".join(row).split(",") for row in sample_rows], count
+    )
+    record_bytes = bytes_per_row(
+        lambda: load_records(DailyLog, sample_rows), count
+    )
+    print(
+        f"daily log row: {row_bytes:.0f} bytes as strings, "
+        f"{record_bytes:.0f} bytes as a record"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+In-process stand-in for the tracker's Google Sheet, for benchmarks.
+
+FakeSpreadsheet holds one FakeWorksheet per tracker worksheet. The
+worksheets implement the gspread Worksheet methods the app uses, keep
+their cells as strings like the Sheets API returns them, and count every
+call by (worksheet, method). Each call can be slowed down by a simulated
+network latency, and a simulated quota (calls per minute) raises the
+same 429 APIError as Google Sheets when it is exceeded. The cells each
+call returns are counted too, as a measure of the data transferred.
+
+generate_tracker_data() produces realistic users and logs: babies born
+over the past years, each logged on most days of their first year, with
+weekly growth measurements and occasional milestones. Every user has the
+password "secret<number>", hashed with few iterations so that generating
+large sheets stays fast.
+"""
+
+# Standard libraries
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, timedelta
+
+# Third party libraries
+from gspread.exceptions import APIError
+
+# Local modules
+from auth import hash_password
+from scheduler import RequestScheduler
+from storage import WORKSHEET_HEADERS, wrap_gspread_worksheets
+
+MILESTONES = [
+    "first smile", "laughing", "rolling over", "sitting up", "babbling",
+    "crawling", "first tooth", "pulling to stand", "first steps",
+    "first word"
+]
+
+
+class FakeResponse:
+    # Just enough of a requests.Response for gspread's APIError
+    def __init__(self, code, message):
+        self.status_code = code
+        self.text = message
+        self.payload = {"error": {
+            "code": code, "message": message, "status": "RESOURCE_EXHAUSTED"
+        }}
+
+    def json(self):
+        return self.payload
+
+
+class FakeSpreadsheet:
+    """
+    The tracker worksheets with shared latency, quota and call counts.
+    'latency' is the mean delay of a call in seconds (each call takes
+    between half and one and a half times as long); 'quota' is the
+    number of calls allowed per 'quota_window' seconds, None for no
+    limit.
+    """
+
+    def __init__(self, tables, latency=0.0, quota=None, quota_window=60.0,
+                 seed=1):
+        self.latency = latency
+        self.quota = quota
+        self.quota_window = quota_window
+        self.calls = Counter()
+        self.cells = Counter()
+        self.throttled = 0
+        self.recent = deque()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.worksheets = {
+            title: FakeWorksheet(self, title, rows)
+            for title, rows in tables.items()
+        }
+
+    def call(self, title, method):
+        # Count the call, enforce the quota, then wait out the latency
+        with self.lock:
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > self.quota_window:
+                self.recent.popleft()
+            if self.quota is not None and len(self.recent) >= self.quota:
+                self.throttled += 1
+                raise APIError(FakeResponse(
+                    429, "Quota exceeded for quota metric 'Read requests'"
+                ))
+            self.recent.append(now)
+            self.calls[(title, method)] += 1
+            delay = self.latency * self.random.uniform(0.5, 1.5)
+        if delay:
+            time.sleep(delay)
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def returned(self, title, method, rows):
+        # Count the cells of a read's result, and pass it on
+        with self.lock:
+            self.cells[(title, method)] += sum(len(row) for row in rows)
+        return rows
+
+    def open_worksheets(self):
+        # Wrapped exactly as storage.open_gspread_worksheets() does
+        self.scheduler = RequestScheduler.from_environment()
+        return wrap_gspread_worksheets(self.worksheets, self.scheduler)
+
+
+class FakeWorksheet:
+    """
+    The gspread Worksheet methods used by storage.GspreadWorksheet.
+    """
+
+    def __init__(self, spreadsheet, title, rows):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = [[str(value) for value in row] for row in rows]
+        self.row_count = max(1000, len(self.rows))
+
+    def _call(self, method):
+        self.spreadsheet.call(self.title, method)
+
+    def _returned(self, method, rows):
+        return self.spreadsheet.returned(self.title, method, rows)
+
+    def get_all_values(self):
+        self._call("get_all_values")
+        return self._returned(
+            "get_all_values", [list(row) for row in self.rows]
+        )
+
+    def col_values(self, col):
+        self._call("col_values")
+        values = [row[col - 1] for row in self.rows if len(row) >= col]
+        self.spreadsheet.returned(self.title, "col_values", [values])
+        return values
+
+    def _range(self, range_name):
+        # Whole-row ranges such as "5:10" or whole-column ones like "A:B"
+        first, last = range_name.split(":")
+        if first.isdigit():
+            return [list(row) for row in self.rows[int(first) - 1:int(last)]]
+        width = ord(last) - ord("A") + 1
+        return [row[:width] for row in self.rows]
+
+    def get_values(self, range_name):
+        self._call("get_values")
+        return self._returned("get_values", self._range(range_name))
+
+    def batch_get(self, ranges):
+        self._call("batch_get")
+        blocks = [self._range(range_name) for range_name in ranges]
+        self._returned("batch_get", [row for block in blocks for row in block])
+        return blocks
+
+    def append_row(self, values):
+        self._call("append_row")
+        self.rows.append([str(value) for value in values])
+
+    def append_rows(self, values):
+        self._call("append_rows")
+        self.rows.extend([str(value) for value in row] for row in values)
+
+    def batch_update(self, data):
+        self._call("batch_update")
+        for block in data:
+            number = int(block['range'].lstrip("A"))
+            for offset, row in enumerate(block['values']):
+                index = number - 1 + offset
+                while len(self.rows) <= index:
+                    self.rows.append([])
+                self.rows[index] = [str(value) for value in row]
+
+    def add_rows(self, rows):
+        self._call("add_rows")
+        self.row_count += rows
+
+    def clear(self):
+        self._call("clear")
+        self.rows = []
+
+
+def generate_tracker_data(users, years=2, seed=1, today=None):
+    """
+    Returns rows (header first) for every tracker worksheet: 'users'
+    babies born over the past 'years' years, each with a daily log on
+    about 85% of the days of their first year (up to today), a growth
+    measurement about once a week and a milestone about every three
+    weeks, and a password hash. The summary worksheet holds only its
+    header.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    tables = {title: [headers] for title, headers in WORKSHEET_HEADERS.items()}
+
+    for number in range(users):
+        username = f"parent{number}"
+        dob = today - timedelta(days=rng.randint(0, 365 * years))
+        age_days = (today - dob).days
+        weight = rng.uniform(2.6, 4.2)
+        height = rng.uniform(46, 54)
+        tables['user_info'].append([
+            username, f"baby{number}", dob.isoformat(),
+            str(age_days * 12 // 365), f"{weight:.2f}", f"{height:.1f}",
+            rng.choice(["boy", "girl", ""])
+        ])
+        tables['credentials'].append([
+            username, hash_password(f"secret{number}", iterations=1000)
+        ])
+
+        for day in range(min(age_days, 364) + 1):
+            log_date = (dob + timedelta(days=day)).isoformat()
+            if rng.random() < 0.85:
+                tables['daily_logs'].append([
+                    username, log_date,
+                    f"{rng.uniform(16, 12) - day / 120:.1f}",
+                    str(rng.randint(450, 950)),
+                    str(rng.randint(5, 9)), str(rng.randint(1, 5))
+                ])
+            if rng.random() < 1 / 7:
+                tables['growth'].append([
+                    username, log_date,
+                    f"{weight + day * 0.02:.2f}",
+                    f"{height + day * 0.07:.1f}"
+                ])
+            if rng.random() < 1 / 21:
+                tables['milestones'].append([
+                    username, log_date, rng.choice(MILESTONES)
+                ])
+    return tables
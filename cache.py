@@ -0,0 +1,554 @@
+"""
+In-memory caches that spare repeated reads of the tracker worksheets.
+
+The cache lifetime is configured with the BABY_TRACKER_CACHE_TTL
+environment variable (seconds, default 300). Once a cache is older than
+that it is reloaded from its worksheet on the next lookup.
+"""
+
+# Standard libraries
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+
+# Local modules
+from instrumentation import in_current_operation
+from records import date_ordinal, load_records
+
+# Default number of seconds before a cache is reloaded
+DEFAULT_CACHE_TTL = 300
+
+# Seconds before an index whose sheet could not be read tries again
+OFFLINE_RETRY_INTERVAL = 30
+
+
+def cache_ttl():
+    """
+    Returns the configured cache lifetime in seconds.
+    """
+    return float(os.environ.get('BABY_TRACKER_CACHE_TTL', DEFAULT_CACHE_TTL))
+
+
+def row_ranges(numbers):
+    """
+    Groups sorted sheet row numbers into a tuple of (first, last) blocks
+    of consecutive rows.
+    """
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return tuple((first, last) for first, last in ranges)
+
+
+def fetch_concurrently(*reads):
+    """
+    Runs the given read functions at the same time, one thread each, and
+    returns their results in order, so several round trips to the
+    backend cost about as long as one. Raises the first read's error
+    once all of them have finished. The reads are tagged with the
+    caller's operation.
+    """
+    if len(reads) <= 1:
+        return [read() for read in reads]
+    with ThreadPoolExecutor(len(reads), thread_name_prefix="fetch") as pool:
+        futures = [
+            pool.submit(in_current_operation(read)) for read in reads
+        ]
+    return [future.result() for future in futures]
+
+
+class TimedCache:
+    """
+    Base class for caches loaded from a worksheet. Subclasses implement
+    refresh() to reload their contents and set loaded_at, and hold
+    'lock' while changing them so a cache can be shared between threads.
+    """
+
+    def __init__(self, sheet, ttl=None):
+        self.sheet = sheet
+        self.ttl = cache_ttl() if ttl is None else ttl
+        self.loaded_at = None
+        self.lock = threading.RLock()
+
+    def refresh(self):
+        raise NotImplementedError
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def is_stale(self):
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > self.ttl
+        )
+
+    def ensure_fresh(self):
+        with self.lock:
+            if self.is_stale():
+                self.refresh()
+
+
+class LogIndex(TimedCache):
+    """
+    Hash set of the (username, log_date) keys already stored in a log
+    worksheet. The sheet is read once per TTL period; rows appended by
+    this process are added to the set as they are written and kept
+    across reloads until the sheet shows them. While the sheet cannot be
+    read, lookups use the keys already known.
+    """
+
+    def __init__(self, sheet, ttl=None):
+        super().__init__(sheet, ttl)
+        self.keys = set()
+        # Keys added by this process, not yet seen in the sheet
+        self.added = set()
+        # No reload is tried before this time after one failed
+        self.retry_at = 0
+
+    def refresh(self):
+        # Rebuild the key set from the username and date columns
+        keys = {
+            (row[0], row[1])
+            for row in self.sheet.get_columns(2)[1:] if len(row) >= 2
+        }
+        with self.lock:
+            self.added -= keys
+            self.keys = keys | self.added
+            self.loaded_at = time.monotonic()
+
+    def refresh_if_reachable(self):
+        """
+        Reloads the keys if they are stale, keeping the known ones when
+        the sheet cannot be read. Returns True if the keys are fresh.
+        """
+        with self.lock:
+            if not self.is_stale():
+                return True
+            if time.monotonic() < self.retry_at:
+                return False
+            try:
+                self.refresh()
+            except Exception:
+                self.retry_at = time.monotonic() + OFFLINE_RETRY_INTERVAL
+                return False
+            return True
+
+    def exists(self, username, log_date):
+        self.refresh_if_reachable()
+        return (username, log_date) in self.keys
+
+    def add(self, username, log_date):
+        # Record a key without reading the sheet
+        with self.lock:
+            self.keys.add((username, log_date))
+            self.added.add((username, log_date))
+
+    def reserve(self, username, log_date):
+        """
+        Adds the key unless it is already present, in one step. Returns
+        False for a duplicate.
+        """
+        with self.lock:
+            self.refresh_if_reachable()
+            if (username, log_date) in self.keys:
+                return False
+            self.add(username, log_date)
+            return True
+
+    def release(self, username, log_date):
+        # Undo a reservation whose row could not be saved
+        with self.lock:
+            self.keys.discard((username, log_date))
+            self.added.discard((username, log_date))
+
+
+class RowNumberIndex(TimedCache):
+    """
+    Sheet row number of each username's first row, so that one user's
+    row can be fetched on its own. Built from a read of the username
+    column only, once per TTL period; a username that is not in the map
+    is looked up with the backend's find_row_number(), and one that is
+    not found either is remembered as missing until the next reload.
+    """
+
+    def __init__(self, sheet, ttl=None):
+        super().__init__(sheet, ttl)
+        self.numbers = {}
+        self.missing = set()
+
+    def refresh(self):
+        usernames = self.sheet.col_values(1)
+        numbers = {}
+        for number, username in enumerate(usernames[1:], start=2):
+            if username:
+                numbers.setdefault(username, number)
+        with self.lock:
+            self.numbers = numbers
+            self.missing = set()
+            self.loaded_at = time.monotonic()
+
+    def load(self, usernames):
+        # Reset the map to a sheet just written with these usernames,
+        # one per row below the header
+        with self.lock:
+            self.numbers = {}
+            self.missing = set()
+            for number, username in enumerate(usernames, start=2):
+                self.numbers.setdefault(username, number)
+            self.loaded_at = time.monotonic()
+
+    def has_users(self):
+        self.ensure_fresh()
+        return bool(self.numbers)
+
+    def row_number(self, username):
+        # A username missing from a map that was not just read may have
+        # been added by another process since
+        refreshed = self.is_stale()
+        self.ensure_fresh()
+        with self.lock:
+            number = self.numbers.get(username)
+            if number is not None or username in self.missing:
+                return number
+        if not refreshed:
+            number = self.sheet.find_row_number(username)
+        with self.lock:
+            if number is None:
+                self.missing.add(username)
+            else:
+                self.numbers[username] = number
+        return number
+
+    def fetch(self, username):
+        """
+        Returns the user's row, fetching that row alone, or None if the
+        username is not in the sheet.
+        """
+        for _ in range(2):
+            number = self.row_number(username)
+            if number is None:
+                return None
+            rows = self.sheet.get_rows(number, number)
+            if rows and rows[0] and rows[0][0] == username:
+                return rows[0]
+            # The sheet changed under the map; reload it once
+            self.invalidate()
+        return None
+
+
+class UserDirectory(TimedCache):
+    """
+    Full user_info rows keyed by username, shared by the login,
+    registration and profile lookups. Rows never change once written, so
+    a username found here is served from memory; one that is not, while
+    the directory is stale, is fetched alone through a RowNumberIndex
+    rather than by reading the whole sheet. Registration reads the sheet
+    in full, once per TTL period, to keep usernames unique, and new
+    registrations are added as they are written and kept across reloads
+    until the sheet shows them.
+    """
+
+    def __init__(self, sheet, ttl=None):
+        super().__init__(sheet, ttl)
+        self.users = {}
+        # Rows added by this process, not yet seen in the sheet
+        self.added = {}
+        self.row_numbers = RowNumberIndex(sheet, ttl)
+
+    def refresh(self):
+        # Keep the first row for each username, as the sheet scans did
+        users = {}
+        for row in self.sheet.get_all_values()[1:]:
+            users.setdefault(row[0], row)
+        with self.lock:
+            for username in list(self.added):
+                if username in users:
+                    del self.added[username]
+                else:
+                    users[username] = self.added[username]
+            self.users = users
+            self.loaded_at = time.monotonic()
+
+    def get(self, username):
+        with self.lock:
+            row = self.users.get(username)
+            if row is not None or not self.is_stale():
+                return row
+        row = self.row_numbers.fetch(username)
+        if row is not None:
+            with self.lock:
+                row = self.users.setdefault(username, row)
+        return row
+
+    def find(self, username):
+        # Like get(), for callers looking up many usernames: the whole
+        # sheet is read once per TTL period instead of a row per user
+        self.ensure_fresh()
+        with self.lock:
+            return self.users.get(username)
+
+    def add(self, row):
+        """
+        Adds a new user's row. Returns False, leaving the directory
+        unchanged, if the username is already taken.
+        """
+        with self.lock:
+            self.ensure_fresh()
+            if row[0] in self.users:
+                return False
+            self.add_row(row)
+            return True
+
+    def add_row(self, row):
+        # Remember a user_info row that is waiting to be saved, without
+        # reading the sheet
+        row = [str(value) for value in row]
+        with self.lock:
+            self.users.setdefault(row[0], row)
+            self.added.setdefault(row[0], row)
+
+    def remove(self, username):
+        # Undo an add() whose row could not be saved
+        with self.lock:
+            self.users.pop(username, None)
+            self.added.pop(username, None)
+
+
+class DateRangeIndex(TimedCache):
+    """
+    Dates and sheet row numbers of each user's rows in a log worksheet,
+    sorted by date, so that one user's logs between two dates are found
+    by bisection and only those rows are fetched, in a single batch
+    request. The username and date columns are read once per TTL period;
+    rows saved by this process are kept in memory until they show up
+    there.
+    """
+
+    def __init__(self, sheet, record_type, ttl=None):
+        super().__init__(sheet, ttl)
+        self.record_type = record_type
+        # username -> (sorted date ordinals, sheet row numbers in the
+        # same order)
+        self.users = {}
+        # username -> records saved by this process, not yet in 'users'
+        self.added = {}
+
+    def refresh(self):
+        grouped = {}
+        rows = self.sheet.get_columns(2)[1:]
+        for number, row in enumerate(rows, start=2):
+            if len(row) < 2 or not row[0].strip():
+                continue
+            try:
+                log_date = date_ordinal(row[1])
+            except ValueError:
+                continue
+            grouped.setdefault(row[0], []).append((log_date, number))
+        users = {}
+        for username, entries in grouped.items():
+            # Rows of the same date stay in sheet order
+            entries.sort()
+            users[username] = (
+                [log_date for log_date, _ in entries],
+                [number for _, number in entries]
+            )
+        with self.lock:
+            self.users = users
+            for username, records in list(self.added.items()):
+                dates = set(users.get(username, ([], []))[0])
+                records = [
+                    record for record in records
+                    if record.log_date not in dates
+                ]
+                if records:
+                    self.added[username] = records
+                else:
+                    del self.added[username]
+            self.loaded_at = time.monotonic()
+
+    def add_row(self, row):
+        # Remember a newly saved row until the sheet is read again
+        record = self.record_type.from_row(row)
+        with self.lock:
+            self.added.setdefault(record.username, []).append(record)
+
+    def _fetch(self, username, numbers):
+        # Records of the user's rows with the given numbers, in sheet order
+        rows = self.sheet.get_row_ranges(row_ranges(sorted(numbers)))
+        return load_records(
+            self.record_type,
+            [row for row in rows if row and row[0] == username]
+        )
+
+    def _added(self, username, start, end):
+        return [
+            record for record in self.added.get(username, ())
+            if (start is None or record.log_date >= start)
+            and (end is None or record.log_date <= end)
+        ]
+
+    def between(self, username, start=None, end=None):
+        """
+        Returns the user's records dated from 'start' to 'end' (date
+        ordinals, both inclusive, None for no limit), oldest first.
+        """
+        with self.lock:
+            self.ensure_fresh()
+            dates, numbers = self.users.get(username, ([], []))
+            first = 0 if start is None else bisect_left(dates, start)
+            last = len(dates) if end is None else bisect_right(dates, end)
+            numbers = numbers[first:last]
+            added = self._added(username, start, end)
+        records = self._fetch(username, numbers) if numbers else []
+        records.extend(added)
+        # The sort is stable, so rows of the same date keep sheet order
+        records.sort(key=attrgetter("log_date"))
+        return records
+
+    def latest(self, username, end=None):
+        """
+        Returns the user's record with the latest date up to 'end', the
+        first saved one if several share that date, or None.
+        """
+        with self.lock:
+            self.ensure_fresh()
+            dates, numbers = self.users.get(username, ([], []))
+            last = len(dates) if end is None else bisect_right(dates, end)
+            newest = max(
+                self._added(username, None, end),
+                key=attrgetter("log_date"), default=None
+            )
+            if last == 0 or (
+                newest is not None and newest.log_date > dates[last - 1]
+            ):
+                return newest
+            number = numbers[bisect_left(dates, dates[last - 1])]
+        records = self._fetch(username, [number])
+        return records[0] if records else newest
+
+
+class CachedWorksheet(TimedCache):
+    """
+    Read-through snapshot of a worksheet. Reads are served from a local
+    copy of the sheet for up to one TTL period; writes go to the wrapped
+    worksheet and are applied to the local copy at the same time. The
+    hits and misses counters record how many reads the snapshot served.
+    """
+
+    def __init__(self, sheet, ttl=None):
+        super().__init__(sheet, ttl)
+        self.title = sheet.title
+        self.rows = []
+        self.hits = 0
+        self.misses = 0
+
+    def refresh(self):
+        rows = self.sheet.get_all_values()
+        with self.lock:
+            self.rows = rows
+            self.loaded_at = time.monotonic()
+
+    def snapshot(self):
+        # Count the read and reload the sheet if the copy has expired
+        with self.lock:
+            if self.is_stale():
+                self.misses += 1
+                self.refresh()
+            else:
+                self.hits += 1
+            return self.rows
+
+    def get_all_values(self):
+        return list(self.snapshot())
+
+    def col_values(self, col):
+        # Serve from a fresh snapshot, otherwise read just this column
+        if self.is_stale():
+            return self.sheet.col_values(col)
+        self.hits += 1
+        return [row[col - 1] for row in self.rows if len(row) >= col]
+
+    def get_rows(self, first, last):
+        # Serve from a fresh snapshot, otherwise read just these rows
+        if self.is_stale():
+            return self.sheet.get_rows(first, last)
+        self.hits += 1
+        return self.rows[first - 1:last]
+
+    def get_columns(self, last):
+        if self.is_stale():
+            return self.sheet.get_columns(last)
+        self.hits += 1
+        return [row[:last] for row in self.rows]
+
+    def last_row(self):
+        if self.is_stale():
+            return self.sheet.last_row()
+        self.hits += 1
+        return len(self.rows)
+
+    def get_row_ranges(self, ranges):
+        if self.is_stale():
+            return self.sheet.get_row_ranges(ranges)
+        self.hits += 1
+        return [
+            row for first, last in ranges for row in self.rows[first - 1:last]
+        ]
+
+    def row_exists(self, username, log_date):
+        # Without a fresh snapshot the backend looks the log up itself
+        if self.is_stale():
+            return self.sheet.row_exists(username, log_date)
+        self.hits += 1
+        for row in self.rows[1:]:
+            if row[0] == username and row[1] == log_date:
+                return True
+        return False
+
+    def find_rows(self, username):
+        if self.is_stale():
+            return self.sheet.find_rows(username)
+        self.hits += 1
+        return [row for row in self.rows[1:] if row and row[0] == username]
+
+    def find_row_number(self, username):
+        if self.is_stale():
+            return self.sheet.find_row_number(username)
+        self.hits += 1
+        for number, row in enumerate(self.rows[1:], start=2):
+            if row and row[0] == username:
+                return number
+        return None
+
+    def append_row(self, row):
+        self.append_rows([row])
+
+    def append_rows(self, rows):
+        self.sheet.append_rows(rows)
+        with self.lock:
+            if not self.is_stale():
+                self.rows.extend(
+                    [str(value) for value in row] for row in rows
+                )
+
+    def update_rows(self, rows_by_number):
+        self.sheet.update_rows(rows_by_number)
+        with self.lock:
+            if self.is_stale():
+                return
+            for number, row in rows_by_number.items():
+                while len(self.rows) < number:
+                    self.rows.append([])
+                self.rows[number - 1] = [str(value) for value in row]
+
+    def clear(self):
+        self.sheet.clear()
+        with self.lock:
+            self.rows = []
+            self.loaded_at = time.monotonic()
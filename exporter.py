@@ -0,0 +1,342 @@
+"""
+Streaming export of the tracker worksheets to local files.
+
+Usage:
+    python exporter.py exports/ --format csv
+    python exporter.py exports/ --format columnar --page-size 5000
+
+Each worksheet (user_info, daily_logs, growth and milestones) is read a
+page of rows at a time and written to <out_dir>/<worksheet>.<ext>, so no
+sheet is ever held in memory as a whole. Growth rows get their weight and
+height percentiles (see percentiles.py), scored a page at a time. Values
+are converted to their column types on the way out:
+
+- csv: one header row, then one line per row.
+- jsonl: one JSON object per row, blanks and bad numbers as null.
+- columnar (.btc): a compact binary file of typed column blocks, one
+  block per page. read_columnar() reads it back.
+
+Columnar layout (little-endian): the magic bytes b"BTCOL1", a uint32
+length and a JSON list of [name, type] columns, then blocks of a uint32
+row count followed by each column's data, and a final row count of 0.
+float columns are float64 (NaN for blank), int columns int32 and date
+columns int32 days since 1970-01-01 (both with NULL_INT for blank), and
+str columns a uint32 byte length, uint32 end offsets and UTF-8 text.
+"""
+
+# Standard libraries
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+from datetime import date, datetime
+from functools import partial
+
+# Third party libraries
+from colorama import init, Fore, Style
+
+# Local modules
+from percentiles import annotate_entries, birth_details
+from records import GrowthEntry
+from storage import iter_pages, open_worksheets
+from validation import DATE_FORMAT
+
+# Column names and types of each exported worksheet
+EXPORT_SCHEMAS = {
+    'user_info': [
+        ("username", "str"), ("baby_name", "str"), ("baby_dob", "date"),
+        ("age_months", "int"), ("birth_weight", "float"),
+        ("birth_height", "float"), ("baby_sex", "str")
+    ],
+    'daily_logs': [
+        ("username", "str"), ("log_date", "date"),
+        ("sleep_hours", "float"), ("feed_ml", "float"),
+        ("wet_diapers", "int"), ("dirty_diapers", "int")
+    ],
+    'growth': [
+        ("username", "str"), ("log_date", "date"),
+        ("weight", "float"), ("height", "float"),
+        ("weight_percentile", "float"), ("height_percentile", "float")
+    ],
+    'milestones': [
+        ("username", "str"), ("log_date", "date"), ("milestone", "str")
+    ],
+}
+
+# File extension of each export format
+EXTENSIONS = {'csv': 'csv', 'jsonl': 'jsonl', 'columnar': 'btc'}
+
+DEFAULT_PAGE_SIZE = 5000
+
+MAGIC = b"BTCOL1"
+NULL_INT = -2 ** 31
+EPOCH = date(1970, 1, 1).toordinal()
+
+
+def convert(value, column_type):
+    """
+    Converts a cell to its column type; blank or invalid cells become
+    None. Dates stay ISO strings.
+    """
+    value = value.strip()
+    if column_type == "str":
+        return value
+    if value == "":
+        return None
+    try:
+        if column_type == "float":
+            return float(value)
+        if column_type == "int":
+            return int(float(value))
+        return datetime.strptime(value, DATE_FORMAT).date().isoformat()
+    except ValueError:
+        return None
+
+
+def typed_rows(rows, schema):
+    # Pad short rows and convert every cell to its column type
+    width = len(schema)
+    for row in rows:
+        row = list(row[:width]) + [""] * (width - len(row))
+        yield [
+            convert(value, column_type)
+            for value, (_, column_type) in zip(row, schema)
+        ]
+
+
+def add_percentiles(rows, births):
+    """
+    Returns a page of growth rows with the weight and height percentiles
+    appended, blank where there is none. 'births' maps usernames to
+    birth_details().
+    """
+    entries = []
+    for row in rows:
+        try:
+            entries.append(GrowthEntry.from_row(row))
+        except (IndexError, ValueError):
+            entries.append(None)
+    annotate_entries([entry for entry in entries if entry is not None], births)
+    result = []
+    for row, entry in zip(rows, entries):
+        row = (list(row) + [""] * 4)[:4]
+        if entry is not None:
+            row += [
+                "" if value is None else str(value)
+                for value in (entry.weight_percentile, entry.height_percentile)
+            ]
+        result.append(row)
+    return result
+
+
+class CSVExport:
+    def __init__(self, file, schema):
+        self.writer = csv.writer(file)
+        self.writer.writerow([name for name, _ in schema])
+
+    def write_page(self, rows):
+        self.writer.writerows(
+            ["" if value is None else value for value in row]
+            for row in rows
+        )
+
+    def close(self):
+        pass
+
+
+class JSONLExport:
+    def __init__(self, file, schema):
+        self.file = file
+        self.names = [name for name, _ in schema]
+
+    def write_page(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(self.names, row))) + "\n")
+
+    def close(self):
+        pass
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+class ColumnarExport:
+    def __init__(self, file, schema):
+        self.file = file
+        self.schema = schema
+        header = json.dumps(schema).encode("utf-8")
+        file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def write_page(self, rows):
+        rows = list(rows)
+        self.file.write(struct.pack("<I", len(rows)))
+        for index, (_, column_type) in enumerate(self.schema):
+            self.file.write(self._column(
+                [row[index] for row in rows], column_type
+            ))
+
+    def _column(self, values, column_type):
+        if column_type == "float":
+            return _little_endian(array("d", [
+                math.nan if value is None else value for value in values
+            ]))
+        if column_type == "int":
+            return _little_endian(array("i", [
+                NULL_INT if value is None else value for value in values
+            ]))
+        if column_type == "date":
+            return _little_endian(array("i", [
+                NULL_INT if value is None
+                else date.fromisoformat(value).toordinal() - EPOCH
+                for value in values
+            ]))
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = array("I")
+        end = 0
+        for text in encoded:
+            end += len(text)
+            offsets.append(end)
+        return (
+            struct.pack("<I", end) + _little_endian(offsets)
+            + b"".join(encoded)
+        )
+
+    def close(self):
+        self.file.write(struct.pack("<I", 0))
+
+
+EXPORTERS = {
+    'csv': CSVExport, 'jsonl': JSONLExport, 'columnar': ColumnarExport
+}
+
+
+def read_columnar(path):
+    """
+    Yields each block of a columnar export as a dict of column name to a
+    list of values (None for blanks, dates as ISO strings).
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a columnar export")
+        (length,) = struct.unpack("<I", file.read(4))
+        schema = json.loads(file.read(length))
+        while True:
+            (count,) = struct.unpack("<I", file.read(4))
+            if count == 0:
+                return
+            block = {}
+            for name, column_type in schema:
+                block[name] = _read_column(file, count, column_type)
+            yield block
+
+
+def _read_array(file, typecode, count):
+    values = array(typecode)
+    values.frombytes(file.read(values.itemsize * count))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _read_column(file, count, column_type):
+    if column_type == "float":
+        return [
+            None if math.isnan(value) else value
+            for value in _read_array(file, "d", count)
+        ]
+    if column_type == "int":
+        return [
+            None if value == NULL_INT else value
+            for value in _read_array(file, "i", count)
+        ]
+    if column_type == "date":
+        return [
+            None if value == NULL_INT
+            else date.fromordinal(value + EPOCH).isoformat()
+            for value in _read_array(file, "i", count)
+        ]
+    (size,) = struct.unpack("<I", file.read(4))
+    offsets = _read_array(file, "I", count)
+    data = file.read(size)
+    values = []
+    start = 0
+    for end in offsets:
+        values.append(data[start:end].decode("utf-8"))
+        start = end
+    return values
+
+
+def export_sheet(sheet, schema, path, file_format,
+                 page_size=DEFAULT_PAGE_SIZE, extend=None):
+    """
+    Streams one worksheet to 'path' page by page. 'extend', if given, is
+    called with each page of rows and returns them with any computed
+    columns added. Returns the number of rows written.
+    """
+    mode = "wb" if file_format == "columnar" else "w"
+    options = {} if mode == "wb" else {"newline": "", "encoding": "utf-8"}
+    count = 0
+    with open(path, mode, **options) as file:
+        exporter = EXPORTERS[file_format](file, schema)
+        for rows in iter_pages(sheet, page_size):
+            rows = [row for row in rows if any(cell for cell in row)]
+            if rows:
+                if extend is not None:
+                    rows = extend(rows)
+                exporter.write_page(list(typed_rows(rows, schema)))
+                count += len(rows)
+        exporter.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the tracker worksheets to local files."
+    )
+    parser.add_argument("out_dir")
+    parser.add_argument(
+        "--format", choices=sorted(EXPORTERS), default="csv"
+    )
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument(
+        "--sheets", nargs="+", choices=sorted(EXPORT_SCHEMAS),
+        default=list(EXPORT_SCHEMAS)
+    )
+    args = parser.parse_args()
+
+    init(autoreset=True)
+    os.makedirs(args.out_dir, exist_ok=True)
+    worksheets = open_worksheets()
+    extenders = {}
+    if 'growth' in args.sheets:
+        # Percentiles need each baby's date of birth and sex
+        births = {
+            row[0]: birth_details(row)
+            for rows in iter_pages(worksheets['user_info'], args.page_size)
+            for row in rows if row and row[0]
+        }
+        extenders['growth'] = partial(add_percentiles, births=births)
+    for title in args.sheets:
+        path = os.path.join(
+            args.out_dir, f"{title}.{EXTENSIONS[args.format]}"
+        )
+        count = export_sheet(
+            worksheets[title], EXPORT_SCHEMAS[title], path,
+            args.format, args.page_size, extenders.get(title)
+        )
+        print(
+            Fore.GREEN
+            + f"✅ Exported {count} row(s) from {title} to {path}"
+            + Style.RESET_ALL
+        )
+
+
+if __name__ == "__main__":
+    main()
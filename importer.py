@@ -0,0 +1,167 @@
+"""
+Bulk import of daily logs, growth entries and milestones.
+
+Usage:
+    python importer.py daily_logs backfill.csv
+    python importer.py growth growth.jsonl --batch-size 1000
+
+The input is a CSV file with a header row or a JSON Lines file with one
+object per line, using the field names in validation.LOG_FIELDS (for
+example username, log_date, sleep_hours, feed_ml, wet_diapers and
+dirty_diapers for daily_logs). The file is streamed record by record.
+Each record is checked with the same rules as the interactive prompts,
+skipped if its user is not registered or a log for the same username and
+date already exists, and saved in batches of one append_rows call each.
+"""
+
+# Standard libraries
+import argparse
+import csv
+import json
+import os
+
+# Third party libraries
+from colorama import init, Fore, Style
+
+# Local modules
+from cache import LogIndex, UserDirectory
+from storage import open_worksheets
+from validation import LOG_FIELDS, log_row
+
+# Number of rows written per append_rows call
+DEFAULT_BATCH_SIZE = 1000
+
+# Number of rejected records listed in the report
+MAX_ERRORS_SHOWN = 20
+
+
+def read_records(path, file_format=None):
+    """
+    Yields (line number, record dict) from a CSV or JSONL file. The
+    format is taken from the file extension unless given. A JSONL line
+    that is not a JSON object is yielded as a ValueError instead of a
+    record, so that it can be rejected like any invalid record.
+    """
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        file_format = 'jsonl' if extension in ('.jsonl', '.json') else 'csv'
+
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as error:
+                    record = ValueError(f"invalid JSON: {error}")
+                else:
+                    if not isinstance(record, dict):
+                        record = ValueError("not a JSON object")
+                yield line_number, record
+
+
+class ImportReport:
+    """
+    Counts of what happened to the records of one import.
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.unknown_users = 0
+        self.invalid = 0
+        self.errors = []
+
+    def reject(self, line_number, reason):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS_SHOWN:
+            self.errors.append(f"line {line_number}: {reason}")
+
+
+def import_logs(worksheets, title, records, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validates, deduplicates and saves (line number, record) pairs to the
+    'title' log worksheet. Returns an ImportReport.
+    """
+    sheet = worksheets[title]
+    log_index = LogIndex(sheet)
+    users = UserDirectory(worksheets['user_info'])
+    report = ImportReport()
+    batch = []
+
+    for line_number, record in records:
+        if isinstance(record, ValueError):
+            report.reject(line_number, record)
+            continue
+        try:
+            row = log_row(title, record)
+        except ValueError as error:
+            report.reject(line_number, error)
+            continue
+
+        if users.find(row[0]) is None:
+            report.unknown_users += 1
+            continue
+        if log_index.exists(row[0], row[1]):
+            report.duplicates += 1
+            continue
+
+        log_index.add(row[0], row[1])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            sheet.append_rows(batch)
+            report.imported += len(batch)
+            batch = []
+
+    if batch:
+        sheet.append_rows(batch)
+        report.imported += len(batch)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bulk import logs from a CSV or JSONL file."
+    )
+    parser.add_argument("worksheet", choices=sorted(LOG_FIELDS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"])
+    parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE
+    )
+    args = parser.parse_args()
+
+    init(autoreset=True)
+    report = import_logs(
+        open_worksheets(),
+        args.worksheet,
+        read_records(args.path, args.format),
+        args.batch_size
+    )
+
+    print(
+        Fore.GREEN
+        + f"✅ Imported {report.imported} row(s) into {args.worksheet}."
+        + Style.RESET_ALL
+    )
+    if report.duplicates:
+        print(f"Skipped {report.duplicates} duplicate log(s).")
+    if report.unknown_users:
+        print(f"Skipped {report.unknown_users} log(s) for unknown users.")
+    if report.invalid:
+        print(
+            Fore.RED
+            + f"Rejected {report.invalid} invalid record(s):"
+            + Style.RESET_ALL
+        )
+        for error in report.errors:
+            print(Fore.RED + f"  {error}" + Style.RESET_ALL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Accounting of storage backend calls, to find which code paths spend the
+Google Sheets quota.
+
+Off by default. Set BABY_TRACKER_INSTRUMENT=1 to count and time every
+backend call and print a report when the session ends, and/or
+BABY_TRACKER_CALL_LOG=<path> to append one JSON line per call:
+
+    {"ts": 1718000000.12, "operation": "login/is_username_taken",
+     "worksheet": "user_info", "method": "get_all_values",
+     "ms": 143.2, "ok": true}
+
+Calls are tagged with the app operations running when they were made
+(functions decorated with @tracked, nested ones joined by "/"). Work
+handed to another thread with in_current_operation() keeps the tags of
+the operation that started it; other background work, such as the
+journal replayer, is tagged with its thread name.
+Reads served by the in-memory caches never reach the backend and are not
+counted.
+"""
+
+# Standard libraries
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+_local = threading.local()
+
+
+def call_log_path():
+    return os.environ.get("BABY_TRACKER_CALL_LOG") or None
+
+
+def report_requested():
+    return os.environ.get("BABY_TRACKER_INSTRUMENT", "") not in ("", "0")
+
+
+def is_enabled():
+    # Instrumentation is on when a report or a call log is requested
+    return report_requested() or call_log_path() is not None
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current_operation():
+    stack = _stack()
+    if stack:
+        return "/".join(stack)
+    return threading.current_thread().name
+
+
+@contextmanager
+def operation(name):
+    # Tag the backend calls made inside the block with 'name'
+    stack = _stack()
+    stack.append(name)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def in_current_operation(function):
+    """
+    Returns 'function' wrapped to run under the operations running now,
+    for work handed to another thread. Returned as is when
+    instrumentation is off.
+    """
+    if not is_enabled():
+        return function
+    stack = list(_stack())
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        saved = getattr(_local, "stack", None)
+        _local.stack = list(stack)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.stack = saved
+    return wrapper
+
+
+def tracked(function):
+    """
+    Decorator tagging the calls made by a function with its name. Left
+    undecorated when instrumentation is off, so it costs nothing.
+    """
+    if not is_enabled():
+        return function
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with operation(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class CallStats:
+    __slots__ = ("calls", "errors", "seconds", "max_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class CallRecorder:
+    """
+    Per-(operation, worksheet, method) call counts and times, and the
+    optional JSON lines log. Safe to use from several threads.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.log_file = None
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, worksheet, method, seconds, ok):
+        key = (current_operation(), worksheet, method)
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = CallStats()
+            stats.calls += 1
+            stats.errors += not ok
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if self.log_path is not None:
+                if self.log_file is None:
+                    self.log_file = open(
+                        self.log_path, "a", encoding="utf-8", buffering=1
+                    )
+                self.log_file.write(json.dumps({
+                    "ts": round(time.time(), 3),
+                    "operation": key[0],
+                    "worksheet": worksheet,
+                    "method": method,
+                    "ms": round(seconds * 1000, 2),
+                    "ok": ok,
+                }) + "\n")
+
+    def report(self):
+        """
+        Returns the session's calls as text, one line per operation,
+        worksheet and method, most expensive first.
+        """
+        with self.lock:
+            items = sorted(
+                self.stats.items(), key=lambda item: -item[1].seconds
+            )
+        lines = [
+            f"{'operation':<34}{'worksheet':<12}{'method':<16}"
+            f"{'calls':>6}{'errors':>7}{'total ms':>10}{'max ms':>9}"
+        ]
+        calls = seconds = 0
+        for (name, worksheet, method), stats in items:
+            lines.append(
+                f"{name:<34}{worksheet:<12}{method:<16}{stats.calls:>6}"
+                f"{stats.errors:>7}{stats.seconds * 1000:>10.1f}"
+                f"{stats.max_seconds * 1000:>9.1f}"
+            )
+            calls += stats.calls
+            seconds += stats.seconds
+        lines.append(f"Total: {calls} backend calls, {seconds:.2f} s")
+        return "\n".join(lines)
+
+    def close(self):
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
+
+
+# Recorder of this process, set up from the environment
+RECORDER = CallRecorder(call_log_path())
+
+
+class InstrumentedWorksheet:
+    """
+    Wraps a backend worksheet and records every method call on it.
+    """
+
+    def __init__(self, sheet, recorder=RECORDER):
+        self.sheet = sheet
+        self.title = sheet.title
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        attribute = getattr(self.sheet, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = attribute(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                self.recorder.record(
+                    self.title, name, time.perf_counter() - started, ok
+                )
+        return timed
+
+
+def instrument(sheet):
+    # Wrap a backend worksheet when instrumentation is on
+    if is_enabled():
+        return InstrumentedWorksheet(sheet)
+    return sheet
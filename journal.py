@@ -0,0 +1,442 @@
+"""
+Write-ahead journal for new worksheet rows.
+
+Every row the app accepts is first appended to a local append-only file
+and fsync'd, and only then pushed to the worksheets by a background
+replayer. If the Google Sheets API is slow or unreachable the entry is
+kept in the journal and retried later, including after a restart or a
+crash, so typed data is never lost.
+
+Journal format: one entry per line, a compact JSON array of the
+worksheet title and the row, e.g.
+    ["growth",["anna","2025-01-31",5.2,56.0]]
+A line cut short by a crash is dropped when the journal is opened. The
+byte offset up to which entries are known to be saved is kept in a
+"<journal>.offset" file, and the journal is emptied once every entry is
+saved.
+
+Each process has its own journal, "<path>.<pid>" (with "-<n>" added for
+further writers in the same process), locked for as long as
+the process runs, so several terminals in one directory never replay or
+truncate each other's entries. A journal whose lock is free belongs to a
+process that has ended: the next process to start moves its unsaved
+entries into its own journal and deletes it.
+
+An entry the backend refuses because of its values (see
+scheduler.is_rejected()) is moved to "<path>.rejected", one JSON line of
+the title, row and error each, so that the entries after it are still
+saved. When a batch is refused the entries are saved one at a time
+until the refused one is found.
+
+Replay is idempotent on (username, date) for logs and on username for
+user_info: entries that may already have reached the worksheet (pending
+at startup, part of a batch that failed, or accepted while the sheet
+could not be read to check for duplicates) are checked against it and
+skipped if present.
+"""
+
+# Standard libraries
+import json
+import os
+import re
+import threading
+
+# Local modules
+from scheduler import is_rejected
+
+try:
+    import fcntl
+except ImportError:
+    # Without file locks (Windows) journals of ended processes are not
+    # adopted
+    fcntl = None
+
+DEFAULT_JOURNAL_PATH = "baby_tracker.journal"
+
+# Most entries saved per append_rows call
+DEFAULT_BATCH_SIZE = 500
+
+# Seconds to wait for more entries before a replay, so that entries
+# arriving together share one API call
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+# Seconds between replay attempts while the backend is unreachable
+DEFAULT_RETRY_INTERVAL = 30.0
+
+# Suffix of a process journal's file name after "<path>."
+PROCESS_SUFFIX = re.compile(r"\d+(-\d+)?")
+
+
+class JournalInUse(OSError):
+    """
+    Raised when another process, or writer, holds a journal's lock.
+    """
+
+
+def journal_path():
+    # Journal file location, configurable with BABY_TRACKER_JOURNAL
+    return os.environ.get("BABY_TRACKER_JOURNAL", DEFAULT_JOURNAL_PATH)
+
+
+def journal_files(path):
+    """
+    Returns the process journals ("<path>.<pid>") next to 'path', and
+    'path' itself if a version without process journals left it.
+    """
+    directory = os.path.dirname(path) or "."
+    name = os.path.basename(path)
+    return [
+        os.path.join(directory, entry)
+        for entry in sorted(os.listdir(directory))
+        if entry == name or (
+            entry.startswith(name + ".")
+            and PROCESS_SUFFIX.fullmatch(entry[len(name) + 1:])
+        )
+    ]
+
+
+def _try_lock(file):
+    # Take the file's exclusive lock without waiting; False if it is held
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _fsync_write(path, data):
+    # Replace a small file atomically and durably
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class Journal:
+    """
+    An fsync'd append-only file of (title, row) entries and the offset
+    up to which they have been saved. The file is locked while open, so
+    one process uses it at a time. Safe to use from several threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = path + ".offset"
+        self.lock = threading.Lock()
+        self.file = open(path, "ab")
+        if not _try_lock(self.file):
+            self.file.close()
+            raise JournalInUse(f"journal {path} is in use")
+        self._drop_partial_line()
+        self.end = self.file.tell()
+        self.saved = min(_read_offset(self.offset_path), self.end)
+
+    def _drop_partial_line(self):
+        # Cut an entry left half written by a crash
+        with open(self.path, "rb") as file:
+            data = file.read()
+        complete = data.rfind(b"\n") + 1
+        if complete != len(data):
+            self.file.truncate(complete)
+            os.fsync(self.file.fileno())
+        self.file.seek(0, os.SEEK_END)
+
+    def adopt(self, path):
+        """
+        Moves the unsaved entries of the journal at 'path' into this one
+        and deletes it, unless another process still holds its lock.
+        Returns the number of entries moved.
+        """
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        with file:
+            if not _try_lock(file):
+                return 0
+            # Another process may have adopted and deleted it meanwhile
+            try:
+                if not os.path.samestat(os.fstat(file.fileno()),
+                                        os.stat(path)):
+                    return 0
+            except FileNotFoundError:
+                return 0
+            data = file.read()
+            start = min(_read_offset(path + ".offset"), len(data))
+            entries = data[start:data.rfind(b"\n") + 1]
+            if entries:
+                with self.lock:
+                    self.file.write(entries)
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+                    self.end = self.file.tell()
+            # Entries copied twice by a crash here are skipped on replay
+            # by the idempotency check
+            for leftover in (path + ".offset", path):
+                try:
+                    os.remove(leftover)
+                except FileNotFoundError:
+                    pass
+            return entries.count(b"\n")
+
+    def append(self, title, row):
+        # The entry is on disk before this returns
+        line = json.dumps([title, row], separators=(",", ":")) + "\n"
+        with self.lock:
+            self.file.write(line.encode("utf-8"))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.end = self.file.tell()
+
+    def pending(self, limit=None):
+        """
+        Returns up to 'limit' unsaved entries as (end offset, title, row),
+        oldest first.
+        """
+        with self.lock:
+            start, end = self.saved, self.end
+        entries = []
+        with open(self.path, "rb") as file:
+            file.seek(start)
+            offset = start
+            while offset < end and (limit is None or len(entries) < limit):
+                line = file.readline()
+                if not line:
+                    break
+                offset += len(line)
+                title, row = json.loads(line)
+                entries.append((offset, title, row))
+        return entries
+
+    def caught_up(self):
+        with self.lock:
+            return self.saved == self.end
+
+    def mark_saved(self, offset):
+        """
+        Records that every entry up to 'offset' is saved, and empties the
+        journal when nothing is left to replay. Returns True if it was
+        emptied.
+        """
+        with self.lock:
+            if offset == self.end:
+                # Entries replayed again after a crash here are skipped
+                # by the idempotency check
+                _fsync_write(self.offset_path, "0")
+                self.file.truncate(0)
+                os.fsync(self.file.fileno())
+                self.saved = self.end = 0
+                return True
+            _fsync_write(self.offset_path, str(offset))
+            self.saved = offset
+            return False
+
+    def close(self):
+        self.file.close()
+
+
+def _read_offset(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return int(file.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def entry_key(title, row):
+    # Users and passwords are unique by username, logs by username and
+    # date
+    if title in ('user_info', 'credentials'):
+        return str(row[0])
+    return str(row[0]), str(row[1])
+
+
+def saved_keys(sheet, title):
+    # Keys of the rows the worksheet holds, from one read of its key
+    # columns; the backend may leave out trailing blank cells
+    return {
+        entry_key(title, row + [""])
+        for row in sheet.get_columns(2)[1:] if row
+    }
+
+
+class JournalWriter:
+    """
+    Saves rows to the worksheets in the background, journaling each
+    row before queueing it. A daemon thread replays the journal to the
+    worksheets returned by worksheets.worksheet(title), in batches of
+    one append_rows call per worksheet. 'path' is the base name of the
+    process journals; journals left by ended processes are adopted.
+    """
+
+    def __init__(self, worksheets, path=None,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 retry_interval=DEFAULT_RETRY_INTERVAL):
+        self.worksheets = worksheets
+        path = path or journal_path()
+        self.rejected_path = path + ".rejected"
+        self.journal = None
+        attempt = 0
+        while self.journal is None:
+            suffix = f"-{attempt}" if attempt else ""
+            try:
+                self.journal = Journal(f"{path}.{os.getpid()}{suffix}")
+            except JournalInUse:
+                attempt += 1
+        for other in journal_files(path):
+            if other != self.journal.path:
+                self.journal.adopt(other)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        # Entries up to this offset may already be in the worksheets
+        self.verify_until = self.journal.end
+        self.verify_lock = threading.Lock()
+        # Save one entry at a time, to find an entry the backend refuses
+        self.isolate = False
+        self.error = None
+        self.cycles = 0
+        self.flushing = 0
+        self.wake = threading.Event()
+        self.hurry = threading.Event()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        # Start replaying; called at startup to save what a previous run
+        # left in the journal
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="journal-replayer", daemon=True
+                )
+                self.thread.start()
+        self.wake.set()
+
+    def pending_rows(self):
+        # Journaled (title, row) entries not yet saved
+        return [(title, row) for _, title, row in self.journal.pending()]
+
+    def append_row(self, sheet, row, verify=False):
+        # With 'verify' the row is checked against the sheet before it is
+        # saved, for rows accepted without an up-to-date duplicate check
+        with self.verify_lock:
+            self.journal.append(sheet.title, row)
+            if verify:
+                self.verify_until = max(self.verify_until, self.journal.end)
+        self.start()
+
+    def flush(self):
+        """
+        Waits until the journal has been replayed, or until a replay
+        attempt fails. Returns (worksheet title, rows, error) for rows
+        still waiting in the journal; they are retried later.
+        """
+        if self.journal.caught_up():
+            return []
+        self.start()
+        with self.condition:
+            cycles = self.cycles
+            self.flushing += 1
+            self.hurry.set()
+            self.wake.set()
+            self.condition.wait_for(
+                lambda: self.journal.caught_up()
+                or (self.cycles > cycles and self.error is not None)
+            )
+            self.flushing -= 1
+            error = self.error
+        waiting = {}
+        for title, row in self.pending_rows():
+            waiting.setdefault(title, []).append(row)
+        return [(title, rows, error) for title, rows in waiting.items()]
+
+    def _run(self):
+        while True:
+            self.wake.wait(
+                None if self.error is None else self.retry_interval
+            )
+            self.wake.clear()
+            # Let more rows arrive so they share one API call, unless
+            # someone is waiting in flush()
+            if not self.flushing:
+                self.hurry.wait(self.flush_interval)
+            self.hurry.clear()
+            try:
+                while not self.journal.caught_up():
+                    if not self._replay_batch():
+                        break
+            except Exception as error:
+                # Keep the thread alive so that flush() is answered
+                self.error = error
+            with self.condition:
+                self.cycles += 1
+                self.condition.notify_all()
+
+    def _replay_batch(self):
+        # Save the oldest pending entries; returns False if a write fails
+        entries = self.journal.pending(
+            1 if self.isolate else self.batch_size
+        )
+        if not entries:
+            return True
+        batches = {}
+        for offset, title, row in entries:
+            batches.setdefault(title, []).append((offset, row))
+        for title, batch in batches.items():
+            sheet = self.worksheets.worksheet(title)
+            try:
+                rows = self._unsaved(sheet, title, batch)
+                if rows:
+                    sheet.append_rows(rows)
+            except Exception as error:
+                # The call may have reached the sheet before failing
+                with self.verify_lock:
+                    self.verify_until = max(
+                        self.verify_until, entries[-1][0]
+                    )
+                if not is_rejected(error):
+                    self.error = error
+                    return False
+                if len(entries) > 1:
+                    self.isolate = True
+                    return True
+                self._set_aside(title, entries[0][2], error)
+                self.isolate = False
+        with self.verify_lock:
+            if self.journal.mark_saved(entries[-1][0]):
+                self.verify_until = 0
+                self.isolate = False
+        self.error = None
+        return True
+
+    def _set_aside(self, title, row, error):
+        # Keep an entry the backend refuses, so the rest can be saved
+        line = json.dumps([title, row, repr(error)]) + "\n"
+        with open(self.rejected_path, "a", encoding="utf-8") as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _unsaved(self, sheet, title, batch):
+        if batch[0][0] > self.verify_until:
+            return [row for _, row in batch]
+        # Drop cached reads so the check sees what the sheet holds now
+        invalidate = getattr(sheet, "invalidate", None)
+        if invalidate is not None:
+            invalidate()
+        saved = saved_keys(sheet, title)
+        rows = []
+        for offset, row in batch:
+            key = entry_key(title, row)
+            if offset > self.verify_until or key not in saved:
+                rows.append(row)
+            # An entry can be journaled twice by a crash during adopt()
+            saved.add(key)
+        return rows
@@ -0,0 +1,183 @@
+"""
+Growth percentiles against the WHO Child Growth Standards.
+
+growth_reference.csv bundles the WHO LMS parameters of weight-for-age
+and length-for-age for boys and girls, for each month from birth to 12
+months. GrowthReference interpolates them once into a table with one row
+per day of age, so scoring a measurement is a table lookup followed by
+the LMS formula, evaluated for whole arrays of measurements at a time:
+
+    z = ((value / M) ** L - 1) / (L * S)
+
+Babies whose sex was not given at registration are compared with the
+mean of the boys' and girls' parameters. Measurements taken before birth
+or past the end of the tables have no percentile.
+"""
+
+# Standard libraries
+import csv
+import math
+import os
+from functools import lru_cache
+
+# Third party libraries
+import numpy as np
+
+# Local modules
+from records import UserInfo
+from validation import SEXES
+
+REFERENCE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "growth_reference.csv"
+)
+
+# Average length of a month in days, as used by the WHO tables
+DAYS_PER_MONTH = 365.25 / 12
+
+# Vectorised error function for the normal distribution
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+
+def birth_details(row):
+    """
+    Returns (date of birth ordinal, sex) from a user_info row, read as a
+    records.UserInfo, with "" for an unknown sex, or None if the row
+    cannot be read.
+    """
+    try:
+        user = UserInfo.from_row(row)
+    except (IndexError, ValueError):
+        return None
+    sex = user.baby_sex.lower()
+    return user.baby_dob, sex if sex in SEXES.values() else ""
+
+
+class GrowthReference:
+    """
+    LMS parameters by indicator ('weight' or 'height'), sex and day of
+    age, interpolated linearly between the monthly values of the file.
+    """
+
+    def __init__(self, path=REFERENCE_PATH):
+        months = {}
+        with open(path, newline="", encoding="utf-8") as file:
+            for record in csv.DictReader(file):
+                key = (record["indicator"], record["sex"])
+                months.setdefault(key, []).append([
+                    float(record["month"]), float(record["L"]),
+                    float(record["M"]), float(record["S"])
+                ])
+
+        # tables[(indicator, sex)] has columns L, M and S, one row per day
+        self.tables = {}
+        for key, rows in months.items():
+            rows = np.array(sorted(rows))
+            ages = rows[:, 0] * DAYS_PER_MONTH
+            days = np.arange(int(ages[-1]) + 1)
+            self.tables[key] = np.column_stack([
+                np.interp(days, ages, rows[:, column])
+                for column in (1, 2, 3)
+            ])
+        for indicator in {indicator for indicator, _ in self.tables}:
+            boys = self.tables[(indicator, "boy")]
+            girls = self.tables[(indicator, "girl")]
+            size = min(len(boys), len(girls))
+            self.tables[(indicator, "")] = (boys[:size] + girls[:size]) / 2
+
+    def z_scores(self, indicator, sexes, ages, values):
+        """
+        Returns the z-scores of arrays of measurements, given each baby's
+        sex ('boy', 'girl' or '') and age in days. NaN where the age is
+        outside the tables or the value is missing or not positive.
+        """
+        sexes = np.asarray(sexes)
+        ages = np.asarray(ages, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        z = np.full(len(values), np.nan)
+        for sex in ("boy", "girl", ""):
+            table = self.tables[(indicator, sex)]
+            used = (
+                (sexes == sex) & (ages >= 0) & (ages < len(table))
+                & (values > 0)
+            )
+            if not used.any():
+                continue
+            lms = table[ages[used]]
+            power, median, spread = lms[:, 0], lms[:, 1], lms[:, 2]
+            ratio = values[used] / median
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z[used] = np.where(
+                    np.abs(power) < 1e-9,
+                    np.log(ratio) / spread,
+                    (ratio ** power - 1) / (power * spread)
+                )
+        return z
+
+    def percentiles(self, indicator, sexes, ages, values):
+        # Percentiles (0 to 100) of the measurements; NaN as z_scores()
+        z = self.z_scores(indicator, sexes, ages, values)
+        return 50 * (1 + _erf(z / math.sqrt(2)).astype(float))
+
+
+@lru_cache(maxsize=None)
+def reference():
+    # The bundled tables, loaded on first use
+    return GrowthReference()
+
+
+def growth_percentiles(entries, births):
+    """
+    Returns the weight and height percentiles of a list of
+    records.GrowthEntry, given the birth_details() of each entry's baby
+    (None if unknown), as two lists of values rounded to one decimal,
+    with None where there is no percentile.
+    """
+    known = [
+        (entry, birth) for entry, birth in zip(entries, births)
+        if birth is not None
+    ]
+    result = {}
+    if known:
+        ages = [entry.log_date - birth[0] for entry, birth in known]
+        sexes = [birth[1] for _, birth in known]
+        for indicator in ("weight", "height"):
+            values = [
+                np.nan if getattr(entry, indicator) is None
+                else getattr(entry, indicator)
+                for entry, _ in known
+            ]
+            result[indicator] = iter(reference().percentiles(
+                indicator, sexes, ages, values
+            ).tolist())
+
+    columns = ([], [])
+    for birth in births:
+        for column, indicator in zip(columns, ("weight", "height")):
+            value = np.nan if birth is None else next(result[indicator])
+            column.append(None if math.isnan(value) else round(value, 1))
+    return columns
+
+
+def annotate_entries(entries, births):
+    """
+    Sets the weight and height percentiles of each records.GrowthEntry,
+    computed in one batch. 'births' maps usernames to birth_details().
+    """
+    entries = list(entries)
+    weights, heights = growth_percentiles(
+        entries, [births.get(entry.username) for entry in entries]
+    )
+    for entry, weight, height in zip(entries, weights, heights):
+        entry.weight_percentile = weight
+        entry.height_percentile = height
+
+
+def annotate(summaries, births):
+    # Score the latest growth entry of each summary.UserSummary
+    annotate_entries(
+        [
+            summary.latest_growth for summary in summaries
+            if summary.latest_growth is not None
+        ],
+        births
+    )
@@ -0,0 +1,156 @@
+"""
+Typed records for the rows of the tracker worksheets.
+
+Worksheet rows arrive as lists of strings. The classes here convert a row
+once, when it is loaded, into a compact slotted object with numbers as
+floats/ints and dates as ordinal ints (date.toordinal()), so the
+aggregations never reparse the same strings. Blank numeric cells become
+None.
+"""
+
+# Standard libraries
+import sys
+from datetime import datetime
+from functools import lru_cache
+
+# Local modules
+from validation import DATE_FORMAT
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(value):
+    # Logs share a small set of dates, so each string is parsed once
+    return datetime.strptime(value, DATE_FORMAT).toordinal()
+
+
+def _text(value):
+    return str(value).strip()
+
+
+def _float(value):
+    if type(value) is str:
+        value = value.strip()
+        return float(value) if value else None
+    return float(value)
+
+
+def _int(value):
+    if type(value) is str:
+        value = value.strip()
+        return int(value) if value else None
+    return int(value)
+
+
+class UserInfo:
+    __slots__ = (
+        "username", "baby_name", "baby_dob", "age_months",
+        "birth_weight", "birth_height", "baby_sex"
+    )
+
+    def __init__(self, username, baby_name, baby_dob, age_months,
+                 birth_weight, birth_height, baby_sex=""):
+        self.username = username
+        self.baby_name = baby_name
+        self.baby_dob = baby_dob
+        self.age_months = age_months
+        self.birth_weight = birth_weight
+        self.birth_height = birth_height
+        self.baby_sex = baby_sex
+
+    @classmethod
+    def from_row(cls, row):
+        # Users registered before the sex was asked have no seventh cell,
+        # and Google Sheets leaves out blank cells at the end of a row
+        row = list(row) + [""] * (len(cls.__slots__) - len(row))
+        return cls(
+            sys.intern(str(row[0])), str(row[1]), date_ordinal(_text(row[2])),
+            _int(row[3]), _float(row[4]), _float(row[5]),
+            _text(row[6]) if len(row) > 6 else ""
+        )
+
+
+class DailyLog:
+    __slots__ = (
+        "username", "log_date", "sleep_hours", "feed_ml",
+        "wet_diapers", "dirty_diapers"
+    )
+
+    def __init__(self, username, log_date, sleep_hours, feed_ml,
+                 wet_diapers, dirty_diapers):
+        self.username = username
+        self.log_date = log_date
+        self.sleep_hours = sleep_hours
+        self.feed_ml = feed_ml
+        self.wet_diapers = wet_diapers
+        self.dirty_diapers = dirty_diapers
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            sys.intern(str(row[0])), date_ordinal(row[1]),
+            _float(row[2]), _float(row[3]), _int(row[4]), _int(row[5])
+        )
+
+
+class GrowthEntry:
+    __slots__ = (
+        "username", "log_date", "weight", "height",
+        "weight_percentile", "height_percentile"
+    )
+
+    def __init__(self, username, log_date, weight, height):
+        self.username = username
+        self.log_date = log_date
+        self.weight = weight
+        self.height = height
+        # Set by percentiles.annotate_entries()
+        self.weight_percentile = None
+        self.height_percentile = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            sys.intern(str(row[0])), date_ordinal(row[1]),
+            _float(row[2]), _float(row[3])
+        )
+
+
+class Milestone:
+    __slots__ = ("username", "log_date", "milestone")
+
+    def __init__(self, username, log_date, milestone):
+        self.username = username
+        self.log_date = log_date
+        self.milestone = milestone
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            sys.intern(str(row[0])), date_ordinal(row[1]), _text(row[2])
+        )
+
+
+# Record class of each worksheet
+RECORD_TYPES = {
+    'user_info': UserInfo,
+    'daily_logs': DailyLog,
+    'growth': GrowthEntry,
+    'milestones': Milestone,
+}
+
+
+def load_records(record_type, rows):
+    """
+    Converts worksheet rows (without the header) to records, skipping
+    blank rows and rows that are too short or whose date or numbers
+    cannot be parsed.
+    """
+    records = []
+    for row in rows:
+        if not row or not _text(row[0]):
+            continue
+        try:
+            records.append(record_type.from_row(row))
+        except (IndexError, ValueError):
+            continue
+    return records
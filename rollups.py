@@ -0,0 +1,207 @@
+"""
+Materialised daily, weekly and monthly rollups of the log worksheets.
+
+For every user and every day, week (starting on Monday) and month that
+has logs, a Rollup holds the sums of sleep hours, feed volume and
+diapers, the number of daily logs and the number of milestones. A
+user's rollups are built once per cache period from that user's rows
+of the daily_logs and milestones sheets, and updated as new rows are
+saved, so summaries add up a handful of rollups instead of rescanning
+raw rows and a trend over the first year is about 52 weekly rollups.
+Logging in reads the same number of rows whatever the number of users.
+"""
+
+# Standard libraries
+import threading
+import time
+from datetime import date
+
+# Local modules
+from cache import cache_ttl
+from records import RECORD_TYPES
+from summary import is_milestone
+
+
+def week_start(ordinal):
+    # Ordinal of the Monday starting the week of the given day
+    return ordinal - date.fromordinal(ordinal).weekday()
+
+
+def month_start(ordinal):
+    # Ordinal of the first day of the month of the given day
+    return date.fromordinal(ordinal).replace(day=1).toordinal()
+
+
+# Function giving the start of the period of each rollup granularity
+PERIODS = {
+    'day': lambda ordinal: ordinal,
+    'week': week_start,
+    'month': month_start,
+}
+
+
+class Rollup:
+    """
+    Totals of one user's logs over one period, whose first day is
+    'start' (a date ordinal).
+    """
+
+    __slots__ = (
+        "start", "sleep_hours", "feed_ml", "wet_diapers", "dirty_diapers",
+        "days_logged", "milestones"
+    )
+
+    def __init__(self, start):
+        self.start = start
+        self.sleep_hours = 0
+        self.feed_ml = 0
+        self.wet_diapers = 0
+        self.dirty_diapers = 0
+        self.days_logged = 0
+        self.milestones = 0
+
+    def add_daily(self, log):
+        if log.sleep_hours is not None:
+            self.sleep_hours += log.sleep_hours
+        if log.feed_ml is not None:
+            self.feed_ml += log.feed_ml
+        if log.wet_diapers is not None:
+            self.wet_diapers += log.wet_diapers
+        if log.dirty_diapers is not None:
+            self.dirty_diapers += log.dirty_diapers
+        self.days_logged += 1
+
+    def add_milestone(self, milestone):
+        if is_milestone(milestone.milestone):
+            self.milestones += 1
+
+    def as_row(self):
+        return [
+            date.fromordinal(self.start).isoformat(),
+            round(self.sleep_hours, 2),
+            round(self.feed_ml, 2),
+            self.wet_diapers,
+            self.dirty_diapers,
+            self.days_logged,
+            self.milestones
+        ]
+
+
+# Column names of Rollup.as_row()
+ROLLUP_HEADERS = [
+    "Period Start", "Total Sleep (hrs)", "Total Feed (ml)",
+    "Total Wet Diapers", "Total Dirty Diapers", "Days Logged",
+    "Milestones Achieved"
+]
+
+
+class RollupStore:
+    """
+    The day, week and month rollups of each user, built the first time
+    they are needed from that user's rows alone, fetched through the
+    cache.DateRangeIndex of the daily_logs and milestones sheets, and
+    rebuilt once per TTL period. Rows saved by this process are added
+    with add_row(). The store can be shared between threads; the rows
+    are fetched without holding its lock.
+    """
+
+    def __init__(self, daily_logs, milestones, ttl=None):
+        # title -> cache.DateRangeIndex of that log worksheet
+        self.indexes = {'daily_logs': daily_logs, 'milestones': milestones}
+        self.ttl = cache_ttl() if ttl is None else ttl
+        # username -> (time loaded, period -> {period start: Rollup})
+        self.users = {}
+        # username -> (title, record) saved while the user's rollups
+        # were being built
+        self.building = {}
+        self.lock = threading.RLock()
+
+    def invalidate(self):
+        with self.lock:
+            self.users = {}
+
+    def load(self, username):
+        """
+        Returns the user's rollups by period, building them from the
+        user's rows if they are missing or older than the TTL.
+        """
+        with self.lock:
+            loaded = self.users.get(username)
+            if loaded is not None and (
+                time.monotonic() - loaded[0] <= self.ttl
+            ):
+                return loaded[1]
+            self.building.setdefault(username, [])
+        try:
+            records = {
+                title: index.between(username)
+                for title, index in self.indexes.items()
+            }
+        except Exception:
+            with self.lock:
+                self.building.pop(username, None)
+            raise
+        tables = {period: {} for period in PERIODS}
+        for title, loaded in records.items():
+            for record in loaded:
+                self._apply(tables, title, record)
+        with self.lock:
+            # Logs are unique per (username, date), so a row saved during
+            # the fetch is added unless the fetch already returned it
+            for title, record in self.building.pop(username, []):
+                if record.log_date not in {
+                    fetched.log_date for fetched in records[title]
+                }:
+                    self._apply(tables, title, record)
+            self.users[username] = (time.monotonic(), tables)
+        return tables
+
+    def _apply(self, tables, title, record):
+        for rollup in self._rollups(tables, record):
+            if title == 'daily_logs':
+                rollup.add_daily(record)
+            else:
+                rollup.add_milestone(record)
+
+    def _rollups(self, tables, record):
+        # The rollup of each granularity that the record falls into
+        rollups = []
+        for period, period_start in PERIODS.items():
+            start = period_start(record.log_date)
+            rollup = tables[period].get(start)
+            if rollup is None:
+                rollup = tables[period][start] = Rollup(start)
+            rollups.append(rollup)
+        return rollups
+
+    def add_row(self, title, row):
+        """
+        Adds a newly saved daily_logs or milestones row to its user's
+        rollups, in memory only. Rollups built later take the row from
+        the date index, to which the row must be added first.
+        """
+        record = RECORD_TYPES[title].from_row(row)
+        with self.lock:
+            if record.username in self.building:
+                self.building[record.username].append((title, record))
+            loaded = self.users.get(record.username)
+            if loaded is not None:
+                self._apply(loaded[1], title, record)
+
+    def series(self, username, period, start=None, end=None):
+        """
+        Returns the user's rollups of the given granularity ('day',
+        'week' or 'month') whose periods start between 'start' and 'end'
+        (date ordinals, inclusive, None for no limit), oldest first.
+        """
+        tables = self.load(username)
+        with self.lock:
+            rollups = list(tables[period].values())
+        return sorted(
+            (
+                rollup for rollup in rollups
+                if (start is None or rollup.start >= start)
+                and (end is None or rollup.start <= end)
+            ),
+            key=lambda rollup: rollup.start
+        )
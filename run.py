@@ -1,12 +1,35 @@
 # Standard libraries
+import getpass
 import sys
-from datetime import datetime, timedelta
+import threading
+from datetime import date, datetime, timedelta
 
 # Third party libraries
-import gspread
-from google.oauth2.service_account import Credentials
 from colorama import init, Fore, Style
 
+# Local modules
+from storage import LazyWorksheets
+from auth import CredentialStore, SessionStore
+from cache import (
+    DateRangeIndex, LogIndex, RowNumberIndex, UserDirectory,
+    fetch_concurrently
+)
+from records import RECORD_TYPES
+from rollups import RollupStore, week_start
+from journal import JournalWriter
+from instrumentation import (
+    RECORDER, in_current_operation, operation, report_requested, tracked
+)
+from validation import (
+    MIN_PASSWORD_LENGTH, SEXES, is_valid_date, is_valid_float, is_valid_int,
+    is_valid_milestone, is_valid_password, is_valid_sex
+)
+from percentiles import birth_details
+from summary import (
+    SUMMARY_HEADERS, SummaryEngine, summarize_all, summarize_range,
+    window_start
+)
+
 # ANSI escape sequences for bold formatting
 BOLD = "\033[1m"
 RESET = "\033[0m"
@@ -14,40 +37,185 @@ RESET = "\033[0m"
 # Reset text color after each print
 init(autoreset=True)
 
-# Required Google API scopes
-SCOPE = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive.file",
-    "https://www.googleapis.com/auth/drive"
-]
+# Access to the worksheets through the configured storage backend,
+# connected in the background the first time they are needed
+CONNECTION = LazyWorksheets()
+user_info = CONNECTION.worksheet('user_info')
+daily_logs = CONNECTION.worksheet('daily_logs')
+growth = CONNECTION.worksheet('growth')
+milestones = CONNECTION.worksheet('milestones')
+summary_sheet = CONNECTION.worksheet('summary')
+credentials = CONNECTION.worksheet('credentials')
+
+# Journals new rows on disk and saves them in the background, so input
+# never waits on the network and survives an outage or a crash
+WRITER = JournalWriter(CONNECTION)
+
+# (username, log_date) indexes used for duplicate detection
+LOG_INDEXES = {
+    sheet.title: LogIndex(sheet)
+    for sheet in (daily_logs, growth, milestones)
+}
+
+# Per-user date-sorted logs for summaries of any period
+DATE_INDEXES = {
+    sheet.title: DateRangeIndex(sheet, RECORD_TYPES[sheet.title])
+    for sheet in (daily_logs, growth, milestones)
+}
+
+# user_info rows keyed by username
+USER_DIRECTORY = UserDirectory(user_info)
 
-# Load credentials from the service account
-CREDS = Credentials.from_service_account_file('creds.json')
+# Row number of each user's row in the summary sheet
+SUMMARY_ROWS = RowNumberIndex(summary_sheet)
 
-# Apply the required access scopes to credentials
-SCOPED_CREDS = CREDS.with_scopes(SCOPE)
+# Set once the summary sheet's header row is known to be current
+SUMMARY_HEADER_CHECKED = threading.Event()
 
-# Authorize a gspread client using the scoped credentials
-GSPREAD_CLIENT = gspread.authorize(SCOPED_CREDS)
+# Password hashes keyed by username, and the sessions of logged-in users
+CREDENTIALS = CredentialStore(credentials)
+SESSIONS = SessionStore()
 
-# Open the Google Sheet for reading and writing
-SHEET = GSPREAD_CLIENT.open('simple_baby_tracker')
+# Session token of the user logged in at this terminal
+session_token = None
 
-# Access to the worksheets
-user_info = SHEET.worksheet('user_info')
-daily_logs = SHEET.worksheet('daily_logs')
-growth = SHEET.worksheet('growth')
-milestones = SHEET.worksheet('milestones')
-summary_sheet = SHEET.worksheet('summary')
+# Per-user day, week and month totals, updated as logs are saved
+ROLLUPS = RollupStore(DATE_INDEXES['daily_logs'], DATE_INDEXES['milestones'])
+
+# Per-user weekly totals, updated as logs are saved
+SUMMARY_ENGINE = SummaryEngine(
+    ROLLUPS, DATE_INDEXES['growth'], USER_DIRECTORY
+)
 
 
 # Prevent duplicate log entries
+@tracked
 def log_exists(sheet, username, log_date):
-    records = sheet.get_all_values()[1:]
-    for row in records:
-        if row[0] == username and row[1] == log_date:
-            return True
-    return False
+    return LOG_INDEXES[sheet.title].exists(username, log_date)
+
+
+@tracked
+def append_log(sheet, row):
+    """
+    Queues a log row and records it in the duplicate index, rollups and
+    summary. Returns False, without saving, if the user already has a log
+    for that date. While the log sheet cannot be read, duplicates are
+    checked against the logs already known and the row is journaled for
+    the replayer to check against the sheet.
+    """
+    index = LOG_INDEXES[sheet.title]
+    checked = index.refresh_if_reachable()
+    if not index.reserve(row[0], row[1]):
+        return False
+    try:
+        WRITER.append_row(sheet, row, verify=not checked)
+    except Exception:
+        index.release(row[0], row[1])
+        raise
+    # Once journaled the row is safe; the date index and the totals take
+    # it in memory, without reading the sheets. The date index goes first
+    # because the totals of a user are built from it
+    DATE_INDEXES[sheet.title].add_row(row)
+    SUMMARY_ENGINE.record(sheet.title, row)
+    return True
+
+
+def new_user_row(data):
+    # Build the user_info row for a registration, including age in months
+    # and the sex as stored (blank if skipped)
+    baby_age_months = calculate_age_months(data["baby_dob"])
+    return [
+        data["username"],
+        data["baby_name"],
+        data["baby_dob"],
+        str(baby_age_months),
+        data["birth_weight"],
+        data["birth_height"],
+        SEXES.get(data.get("baby_sex", "").strip().lower(), "")
+    ]
+
+
+@tracked
+def save_user(row):
+    """
+    Queues a new user_info row and adds it to the user directory.
+    Returns False, without saving, if the username is already taken.
+    """
+    if not USER_DIRECTORY.add(row):
+        return False
+    try:
+        WRITER.append_row(user_info, row)
+    except Exception:
+        USER_DIRECTORY.remove(row[0])
+        raise
+    return True
+
+
+def restore_journal():
+    """
+    Adds the rows a previous run left unsaved in the journal to the
+    in-memory indexes and totals, so they are not entered twice and show
+    in summaries, and starts saving them. Nothing is read from the
+    backend, so startup does not wait for it.
+    """
+    for title, row in WRITER.pending_rows():
+        if title == 'user_info':
+            USER_DIRECTORY.add_row(row)
+        elif title == 'credentials':
+            CREDENTIALS.add_row(row)
+        else:
+            LOG_INDEXES[title].add(row[0], row[1])
+            DATE_INDEXES[title].add_row(row)
+            SUMMARY_ENGINE.record(title, row)
+    WRITER.start()
+
+
+def flush_writes():
+    # Wait for queued rows to be saved and report any that are still
+    # waiting in the journal
+    for title, rows, error in WRITER.flush():
+        print(
+            Fore.RED
+            + f"⚠️ {len(rows)} row(s) not yet saved to {title}: {error}. "
+            + "They are kept locally and will be saved later."
+            + Style.RESET_ALL
+        )
+
+
+def report_backend_error(error):
+    # Tell the user that the worksheets could not be reached
+    print(
+        Fore.RED
+        + f"⚠️ The tracker data could not be reached ({error}). "
+        + "Please try again later."
+        + Style.RESET_ALL
+    )
+
+
+def save_log(sheet, row, label):
+    """
+    Saves a log entered at the prompts. Returns False, after telling the
+    user why, if the log was not saved.
+    """
+    try:
+        saved = append_log(sheet, row)
+    except Exception as error:
+        report_backend_error(error)
+        return False
+    if not saved:
+        print(
+            Fore.RED
+            + f"🚫 {label} for {row[1]} already exists. "
+            + "Please choose another date."
+            + Style.RESET_ALL
+        )
+    return saved
+
+
+def form_complete(steps, data):
+    # True once every step has an answer, so that after a refused save
+    # only the step that caused it is asked again
+    return all(step["key"] in data for step in steps)
 
 
 def user_input(prompt, allow_back=True, allow_quit=True):
@@ -77,7 +245,8 @@ def user_input(prompt, allow_back=True, allow_quit=True):
             RESET + Style.RESET_ALL
         )
 
-        # Return the user's input
+        # Save any queued rows before leaving
+        flush_writes()
         sys.exit()
 
     # Handle back command if allowed
@@ -86,6 +255,20 @@ def user_input(prompt, allow_back=True, allow_quit=True):
     return response
 
 
+def password_input(prompt):
+    # Like user_input(), without showing what is typed
+    response = getpass.getpass(prompt + " (or type 'q' to quit): ")
+    if response.strip().lower() in ['q', 'quit', 'exit']:
+        print(
+            Fore.BLUE + BOLD +
+            "Exiting the program. Goodbye!" +
+            RESET + Style.RESET_ALL
+        )
+        flush_writes()
+        sys.exit()
+    return response
+
+
 def calculate_age_months(dob_str):
     # Convert the date of birth string to a datetime object
     dob = datetime.strptime(dob_str, '%Y-%m-%d')
@@ -100,21 +283,144 @@ def calculate_age_months(dob_str):
     return age_months
 
 
+@tracked
 def is_username_taken(username):
     # Check if the username exists in the user_info worksheet
-    return username in user_info.col_values(1)
+    return USER_DIRECTORY.get(username) is not None
 
 
+@tracked
 def verify_password(username, password):
-    # Get all records from the user_info worksheet
-    records = user_info.get_all_values()[1:]
+    # Check the password against the user's stored hash, in memory
+    return CREDENTIALS.verify(username, password)
 
-    for row in records:
-        if row[0] == username and row[1] == password:
+
+@tracked
+def set_password(username, password):
+    """
+    Saves the hash of a user's first password. Returns False, without
+    saving, if the user already has one.
+    """
+    row = CREDENTIALS.add(username, password)
+    if row is None:
+        return False
+    WRITER.append_row(credentials, row)
+    return True
+
+
+def start_session(username):
+    # Log the user in at this terminal
+    global session_token
+    session_token = SESSIONS.start(username)
+
+
+def is_signed_in(username):
+    """
+    Checks, without reading any worksheet, that the user logged in at
+    this terminal is 'username' and their session has not expired.
+    """
+    return SESSIONS.user(session_token) == username
+
+
+def session_expired():
+    print(
+        Fore.RED
+        + "Your session has expired. Please log in again."
+        + Style.RESET_ALL
+    )
+
+
+def choose_password():
+    # Ask for a new password twice until both entries match
+    while True:
+        password = password_input(
+            f"Password (at least {MIN_PASSWORD_LENGTH} characters)"
+        )
+        if not is_valid_password(password):
+            print(
+                Fore.RED
+                + f"Please use at least {MIN_PASSWORD_LENGTH} characters."
+                + Style.RESET_ALL
+            )
+            continue
+        if password_input("Repeat Password") != password:
+            print(
+                Fore.RED
+                + "The passwords do not match. Please try again."
+                + Style.RESET_ALL
+            )
+            continue
+        return password
+
+
+def authenticate(username):
+    """
+    Asks for the user's password, allowing three attempts. Users
+    registered before passwords were introduced confirm their baby's
+    name instead and then choose a password. Returns True once the user
+    is verified.
+    """
+    if CREDENTIALS.get(username) is None:
+        print(
+            Fore.YELLOW
+            + "Your account has no password yet. Please confirm your "
+            + "baby's name and choose one."
+            + Style.RESET_ALL
+        )
+        baby_name = user_input("Baby Name", allow_back=False)
+        if USER_DIRECTORY.get(username)[1] != baby_name:
+            print(
+                Fore.RED
+                + "That name does not match our records."
+                + Style.RESET_ALL
+            )
+            return False
+        if not set_password(username, choose_password()):
+            # Another terminal saved a password for the user meanwhile
+            print(
+                Fore.RED
+                + "A password was already set for this account. Please "
+                + "log in with it."
+                + Style.RESET_ALL
+            )
+            return False
+        return True
+
+    for _ in range(3):
+        if verify_password(username, password_input("Password")):
             return True
+        print(Fore.RED + "Wrong password." + Style.RESET_ALL)
     return False
 
 
+def prefetch_login(username):
+    """
+    Starts loading, in the background and all at once, what the summary
+    screens read after a login: the summary sheet's row numbers, the
+    rollups, the growth index and the user's weekly totals. The screens
+    then find the data cached, or wait for the load in progress, instead
+    of reading the worksheets one after another. Call it only once the
+    user is signed in.
+    """
+    def load():
+        try:
+            with operation("prefetch"):
+                fetch_concurrently(
+                    SUMMARY_ROWS.ensure_fresh,
+                    lambda: ROLLUPS.load(username),
+                    DATE_INDEXES['growth'].ensure_fresh,
+                    lambda: SUMMARY_ENGINE.get(username)
+                )
+        except Exception:
+            # The screens read the data again and report the error
+            pass
+
+    threading.Thread(
+        target=in_current_operation(load), name="prefetch", daemon=True
+    ).start()
+
+
+@tracked
 def add_new_user():
 
     # Introductory message with instructions
@@ -174,20 +480,45 @@ def add_new_user():
         {"key": "baby_name", "prompt": "Baby Name"},
         {"key": "baby_dob", "prompt": "Baby DOB (YYYY-MM-DD)"},
         {"key": "birth_weight", "prompt": "Birth Weight (kg)"},
-        {"key": "birth_height", "prompt": "Birth Height (cm)"}
+        {"key": "birth_height", "prompt": "Birth Height (cm)"},
+        {"key": "baby_sex", "prompt": "Baby Sex (boy/girl, Enter to skip)"},
+        {"key": "password", "prompt": "Password", "secret": True}
     ]
 
     data = {}
     current_step = 0
 
     # Loop through each step of the form
-    while current_step < len(steps):
+    while True:
+        if current_step == len(steps):
+            # Calculate baby's age in months and save the row
+            try:
+                saved = save_user(new_user_row(data))
+            except Exception as error:
+                report_backend_error(error)
+                saved = None
+            if saved:
+                break
+            if saved is False:
+                # Another registration took the username meanwhile
+                print(
+                    Fore.RED
+                    + "Username already taken. Please try another."
+                    + Style.RESET_ALL
+                )
+            current_step = 0
+            continue
+
         step = steps[current_step]
         key = step["key"]
         prompt = step["prompt"]
         allow_back = step.get("allow_back", True)
 
         # Get user input for the current step
+        if step.get("secret"):
+            data[key] = choose_password()
+            current_step += 1
+            continue
         response = user_input(prompt, allow_back=allow_back)
 
         # Handle 'back' option
@@ -200,7 +531,12 @@ def add_new_user():
 
         # Validation for username: ensure it's unique
         if key == "username":
-            if is_username_taken(response):
+            try:
+                taken = is_username_taken(response)
+            except Exception as error:
+                report_backend_error(error)
+                continue
+            if taken:
                 print(
                     Fore.RED
                     + "Username already taken. Please try another."
@@ -210,9 +546,7 @@ def add_new_user():
 
         # Validation for date: must match YYYY-MM-DD
         elif key == "baby_dob":
-            try:
-                datetime.strptime(response, "%Y-%m-%d")
-            except ValueError:
+            if not is_valid_date(response):
                 print(
                     Fore.RED
                     + "Invalid date format. Please use YYYY-MM-DD."
@@ -222,9 +556,7 @@ def add_new_user():
 
         # Validation for numeric weight/height
         elif key == "birth_weight" or key == "birth_height":
-            try:
-                float(response)
-            except ValueError:
+            if not is_valid_float(response):
                 print(
                     Fore.RED
                     + "Please enter a valid number."
@@ -232,21 +564,30 @@ def add_new_user():
                 )
                 continue
 
+        # Validation for sex: boy, girl or blank
+        elif key == "baby_sex":
+            if not is_valid_sex(response):
+                print(
+                    Fore.RED
+                    + "Please enter boy or girl, or leave it blank."
+                    + Style.RESET_ALL
+                )
+                continue
+
         # Save valid input
         data[key] = response
         current_step += 1
+        if form_complete(steps, data):
+            current_step = len(steps)
 
-    # Calculate baby's age in months and prepare row for worksheet
-    baby_age_months = calculate_age_months(data["baby_dob"])
-    new_row = [
-        data["username"],
-        data["baby_name"],
-        data["baby_dob"],
-        str(baby_age_months),
-        data["birth_weight"],
-        data["birth_height"]
-    ]
-    user_info.append_row(new_row)
+    if not set_password(data["username"], data["password"]):
+        print(
+            Fore.RED
+            + "A password was already set for this username."
+            + Style.RESET_ALL
+        )
+        return False
+    start_session(data["username"])
 
     # Confirmation message
     print(Fore.GREEN + "\n✅ Registration successful!" + Style.RESET_ALL)
@@ -268,6 +609,7 @@ def add_new_user():
     return data["username"]
 
 
+@tracked
 def login():
     print(
         Fore.CYAN
@@ -283,14 +625,25 @@ def login():
         username = user_input("Username", allow_back=False, allow_quit=True)
         if username == 'b':
             return False
-        if not is_username_taken(username):
+        try:
+            found = is_username_taken(username)
+            verified = found and authenticate(username)
+        except Exception as error:
+            report_backend_error(error)
+            return False
+        if not found:
             # Check if the entered username exists in the user_info sheet
             print(
                 Fore.RED
                 + "Username not found. Please try again."
                 + Style.RESET_ALL
             )
+        elif not verified:
+            return False
         else:
+            start_session(username)
+            # Load the summary data while the profile is shown
+            prefetch_login(username)
             print()
             # Successful login message and welcome greeting
             print(
@@ -312,6 +665,7 @@ def login():
             return username
 
 
+@tracked
 def log_daily_baby_data(current_user):
     # Print header showing which user we are logging data for
     print()
@@ -339,8 +693,23 @@ def log_daily_baby_data(current_user):
     data = {"username": current_user}
     current_step = 0
 
-    # Loop through all input steps until all are completed
-    while current_step < len(steps):
+    # Loop through all input steps until the log is saved
+    while True:
+        if current_step == len(steps):
+            # Prepare a new row with all input data and save it
+            new_row = [
+                data["username"],
+                data["log_date"],
+                float(data["sleep_hours"]),
+                float(data["feed_ml"]),
+                int(data["wet_diapers"]),
+                int(data["dirty_diapers"])
+            ]
+            if save_log(daily_logs, new_row, "Daily log"):
+                break
+            current_step = 0
+            continue
+
         step = steps[current_step]
         key = step["key"]
         prompt = step["prompt"]
@@ -363,14 +732,17 @@ def log_daily_baby_data(current_user):
 
         # Validate log_date input format and duplication
         if key == "log_date":
-            try:
-                datetime.strptime(response, "%Y-%m-%d")
-            except ValueError:
+            if not is_valid_date(response):
                 print(Fore.RED + "Invalid date format." + Style.RESET_ALL)
                 continue
 
             # Check if a log for this user and date already exists
-            if log_exists(daily_logs, current_user, response):
+            try:
+                exists = log_exists(daily_logs, current_user, response)
+            except Exception as error:
+                report_backend_error(error)
+                continue
+            if exists:
                 print(
                     Fore.RED
                     + f"🚫 Daily log for {response} already exists. "
@@ -380,9 +752,7 @@ def log_daily_baby_data(current_user):
                 continue
         # Validate sleep_hours and feed_ml as valid floating-point numbers
         elif key in ["sleep_hours", "feed_ml"]:
-            try:
-                float(response)
-            except ValueError:
+            if not is_valid_float(response):
                 print(
                     Fore.RED
                     + "Please enter a valid number."
@@ -391,9 +761,7 @@ def log_daily_baby_data(current_user):
                 continue
         # Validate wet_diapers and dirty_diapers as valid numbers
         elif key in ["wet_diapers", "dirty_diapers"]:
-            try:
-                int(response)
-            except ValueError:
+            if not is_valid_int(response):
                 print(
                     Fore.RED
                     + "Please enter a valid number."
@@ -403,20 +771,13 @@ def log_daily_baby_data(current_user):
 
         data[key] = response
         current_step += 1
+        if form_complete(steps, data):
+            current_step = len(steps)
 
-    # Prepare a new row with all input data to append to the Google Sheet
-    new_row = [
-        data["username"],
-        data["log_date"],
-        float(data["sleep_hours"]),
-        float(data["feed_ml"]),
-        int(data["wet_diapers"]),
-        int(data["dirty_diapers"])
-    ]
-    daily_logs.append_row(new_row)
     print(Fore.GREEN + "✅ Daily log saved successfully!" + Style.RESET_ALL)
 
 
+@tracked
 def log_growth_data(current_user):
     """
     Prompts the user to log their baby's growth data.
@@ -440,7 +801,19 @@ def log_growth_data(current_user):
     data = {}
     current_step = 0
 
-    while current_step < len(steps):
+    while True:
+        if current_step == len(steps):
+            new_row = [
+                current_user,
+                data["log_date"],
+                float(data["weight"]),
+                float(data["height"]),
+            ]
+            if save_log(growth, new_row, "Growth log"):
+                break
+            current_step = 0
+            continue
+
         step = steps[current_step]
         key = step["key"]
         prompt = step["prompt"]
@@ -461,13 +834,16 @@ def log_growth_data(current_user):
                 continue
 
         if key == "log_date":
-            try:
-                datetime.strptime(response, "%Y-%m-%d")
-            except ValueError:
+            if not is_valid_date(response):
                 print(Fore.RED + "Invalid date format." + Style.RESET_ALL)
                 continue
 
-            if log_exists(growth, current_user, response):
+            try:
+                exists = log_exists(growth, current_user, response)
+            except Exception as error:
+                report_backend_error(error)
+                continue
+            if exists:
                 print(
                     Fore.RED
                     + f"🚫 Growth log for {response} already exists. "
@@ -476,9 +852,7 @@ def log_growth_data(current_user):
                 )
                 continue
         elif key in ["weight", "height"]:
-            try:
-                float(response)
-            except ValueError:
+            if not is_valid_float(response):
                 print(
                     Fore.RED
                     + "Please enter numeric values."
@@ -488,17 +862,13 @@ def log_growth_data(current_user):
 
         data[key] = response
         current_step += 1
+        if form_complete(steps, data):
+            current_step = len(steps)
 
-    new_row = [
-        current_user,
-        data["log_date"],
-        float(data["weight"]),
-        float(data["height"]),
-    ]
-    growth.append_row(new_row)
     print(Fore.GREEN + "✅ Growth data saved successfully!" + Style.RESET_ALL)
 
 
+@tracked
 def show_user_profile(username):
     """
     Displays the user profile by fetching baby details from the
@@ -508,24 +878,25 @@ def show_user_profile(username):
 
     print()
     print(Fore.MAGENTA + "--- Your Profile ---" + Style.RESET_ALL)
-    records = user_info.get_all_values()[1:]
-    for row in records:
-        if row[0] == username:
-            print(f"Username: {row[0]}")
-            print(f"Baby Name: {row[1]}")
-            print(f"Date of Birth: {row[2]}")
-            print(f"Age (months): {row[3]}")
-            print(f"Birth Weight: {row[4]} kg")
-            print(f"Birth Height: {row[5]} cm")
-            return
+    row = USER_DIRECTORY.get(username)
+    if row is not None:
+        print(f"Username: {row[0]}")
+        print(f"Baby Name: {row[1]}")
+        print(f"Date of Birth: {row[2]}")
+        print(f"Age (months): {row[3]}")
+        print(f"Birth Weight: {row[4]} kg")
+        print(f"Birth Height: {row[5]} cm")
+        if len(row) > 6 and row[6]:
+            print(f"Sex: {row[6]}")
+        return
     print(Fore.RED + "Profile not found." + Style.RESET_ALL)
 
 
+@tracked
 def display_user_summary(username):
     """
-    Fetches and displays the summary data for the given user from the
-    'summary_sheet'. If data is found, prints each field with its
-    header. Otherwise, shows a 'no summary found' message.
+    Displays the user's weekly summary, as written to the 'summary_sheet'
+    by update_summary(), from the totals kept in memory.
     """
 
     print()
@@ -534,16 +905,118 @@ def display_user_summary(username):
         + "--- Your Summary ---"
         + Style.RESET_ALL
     )
-    summary_rows = summary_sheet.get_all_values()
-    headers = summary_rows[0]
-    for row in summary_rows[1:]:
-        if row[0] == username:
-            for i, value in enumerate(row):
-                print(f"{headers[i]}: {value}")
-            return
-    print(Fore.RED + "No summary data found." + Style.RESET_ALL)
+    row = SUMMARY_ENGINE.get(username).as_row()
+    for header, value in zip(SUMMARY_HEADERS, row):
+        print(f"{header}: {value}")
+
+
+@tracked
+def display_weekly_trends(username):
+    """
+    Displays the user's weekly totals over the baby's first year, one
+    line per week with logs, read from the weekly rollups.
+    """
+    print()
+    print(
+        Fore.MAGENTA
+        + "--- Your Weekly Trends (first year) ---"
+        + Style.RESET_ALL
+    )
+    # The 52 weeks from the week of birth, or every week without a DOB
+    first = last = None
+    user = USER_DIRECTORY.get(username)
+    if user is not None and is_valid_date(user[2]):
+        birth = datetime.strptime(user[2], '%Y-%m-%d').toordinal()
+        first = week_start(birth)
+        last = first + 51 * 7
+    weeks = ROLLUPS.series(username, 'week', first, last)
+    if not weeks:
+        print(Fore.RED + "No logs found yet." + Style.RESET_ALL)
+        return
+    print("Week of      Sleep (h)  Feed (ml)  Wet  Dirty  Milestones")
+    for week in weeks:
+        start, sleep, feed, wet, dirty, _, achieved = week.as_row()
+        print(
+            f"{start}  {sleep:>9}  {feed:>9}  {wet:>3}  {dirty:>5}  "
+            f"{achieved:>10}"
+        )
+
+
+def ask_summary_period():
+    """
+    Asks which period to summarize: the last 7 days, the last 30 days or
+    custom dates. Returns (start, end) dates, or None to go back.
+    """
+    while True:
+        print()
+        print(Fore.CYAN + "Choose a period:" + Style.RESET_ALL)
+        print("1. Last 7 Days")
+        print("2. Last 30 Days")
+        print("3. Custom Dates")
+
+        choice = user_input("Enter 1–3")
+        if choice == 'b':
+            return None
+        if choice in ('1', '2'):
+            end = date.today()
+            days = 7 if choice == '1' else 30
+            return end - timedelta(days=days - 1), end
+        if choice != '3':
+            print(
+                Fore.RED
+                + "Invalid option. Please enter a number between 1 and 3."
+                + Style.RESET_ALL
+            )
+            continue
+
+        dates = []
+        for prompt in ("From (YYYY-MM-DD)", "To (YYYY-MM-DD)"):
+            while True:
+                response = user_input(prompt)
+                if response == 'b' or is_valid_date(response):
+                    break
+                print(Fore.RED + "Invalid date format." + Style.RESET_ALL)
+            if response == 'b':
+                break
+            dates.append(datetime.strptime(response, '%Y-%m-%d').date())
+        if len(dates) < 2:
+            continue
+        if dates[0] > dates[1]:
+            print(
+                Fore.RED
+                + "The start date must not be after the end date."
+                + Style.RESET_ALL
+            )
+            continue
+        return dates[0], dates[1]
+
+
+@tracked
+def display_period_summary(username):
+    """
+    Displays the user's totals for a period of their choice, answered
+    from the per-user date indexes rather than the summary sheet.
+    """
+    period = ask_summary_period()
+    if period is None:
+        return
+    start, end = period
+
+    summary = summarize_range(
+        username, DATE_INDEXES, start.toordinal(), end.toordinal(),
+        USER_DIRECTORY.get(username)
+    )
+    print()
+    print(
+        Fore.MAGENTA
+        + f"--- Your Summary from {start} to {end} ---"
+        + Style.RESET_ALL
+    )
+    for header, value in zip(SUMMARY_HEADERS, summary.as_row()):
+        print(f"{header}: {value}")
 
 
+@tracked
 def log_milestones(current_user):
     """
     Allows the user to log a milestone (e.g., crawling) for a given date.
@@ -554,13 +1027,9 @@ def log_milestones(current_user):
     print("\n--- Log Baby Milestone ---")
 
     username = current_user
-    if not is_username_taken(username):
-        print(
-            Fore.RED
-            + "Username not found. Please try again."
-            + Style.RESET_ALL
-        )
-        return  # <== only return here if username not found
+    if not is_signed_in(username):
+        session_expired()
+        return
 
     steps = [
         {
@@ -579,7 +1048,14 @@ def log_milestones(current_user):
     data = {}
     current_step = 0
 
-    while current_step < len(steps):
+    while True:
+        if current_step == len(steps):
+            new_row = [username, data["log_date"], data["milestone"]]
+            if save_log(milestones, new_row, "A milestone log"):
+                break
+            current_step = 0
+            continue
+
         step = steps[current_step]
         key = step["key"]
         prompt = step["prompt"]
@@ -599,12 +1075,15 @@ def log_milestones(current_user):
                 continue
 
         if key == "log_date":
-            try:
-                datetime.strptime(response, "%Y-%m-%d")
-            except ValueError:
+            if not is_valid_date(response):
                 print(Fore.RED + "Invalid date format." + Style.RESET_ALL)
                 continue
-            if log_exists(milestones, username, response):
+            try:
+                exists = log_exists(milestones, username, response)
+            except Exception as error:
+                report_backend_error(error)
+                continue
+            if exists:
                 print(
                     Fore.RED
                     + f"🚫 A milestone log for {response} already exists. "
@@ -614,7 +1093,7 @@ def log_milestones(current_user):
                 continue
 
         if key == "milestone":
-            if response.strip().isdigit():
+            if not is_valid_milestone(response):
                 print(
                     Fore.RED
                     + "Milestone cannot be numeric only. "
@@ -624,95 +1103,100 @@ def log_milestones(current_user):
                 continue
         data[key] = response
         current_step += 1
+        if form_complete(steps, data):
+            current_step = len(steps)
 
-    new_row = [username, data["log_date"], data["milestone"]]
-    milestones.append_row(new_row)
     print(Fore.GREEN + "\n✅ Milestone saved successfully!" + Style.RESET_ALL)
 
 
-def update_summary():
+@tracked
+def rebuild_summary():
     """
-    Updates the 'summary_sheet' with the past week's data for each user.
-    This includes total sleep hours, feed volume, diaper counts,
-    milestone achievements, and the latest growth records. Clears the
-    sheet first, recalculates values, and appends a row per user.
+    Rebuilds the whole 'summary_sheet' with the past week's data for
+    each user. The four worksheets are read at the same time; the table,
+    header row included, is built in memory and written to the cleared
+    sheet in a single range update.
     """
+    start = window_start()
 
-    print("\n--- LOADING SUMMARY SHEET... ---")
-    summary_sheet.clear()
-
-    headers = [
-        "Username", "Total Sleep (hrs)", "Total Feed (ml)",
-        "Milestones Achieved", "Latest Weight", "Latest Height",
-        "Total Wet Diapers", "Total Dirty Diapers"
-    ]
-    summary_sheet.append_row(headers)
+    user_rows, daily_rows, milestone_rows, growth_rows = (
+        rows[1:] for rows in fetch_concurrently(
+            user_info.get_all_values, daily_logs.get_all_values,
+            milestones.get_all_values, growth.get_all_values
+        )
+    )
 
-    today = datetime.today()
-    week_ago = today - timedelta(days=7)
+    # Growth percentiles of every growth entry, in one batch
+    summaries = summarize_all(
+        [user[0] for user in user_rows],
+        daily_rows, milestone_rows, growth_rows, start,
+        {user[0]: birth_details(user) for user in user_rows}
+    )
+    table = [SUMMARY_HEADERS]
+    for user in user_rows:
+        summary = summaries[user[0]]
+        SUMMARY_ENGINE.load(summary)
+        table.append(summary.as_row())
 
-    user_rows = user_info.get_all_values()[1:]
-    daily_rows = daily_logs.get_all_values()[1:]
-    milestone_rows = milestones.get_all_values()[1:]
-    growth_rows = growth.get_all_values()[1:]
+    summary_sheet.clear()
+    summary_sheet.update_rows(
+        {number: row for number, row in enumerate(table, start=1)}
+    )
+    SUMMARY_ROWS.load([user[0] for user in user_rows])
+    SUMMARY_HEADER_CHECKED.set()
 
-    for user in user_rows:
-        username = user[0]
 
-        user_daily_logs = [row for row in daily_rows if row[0] == username]
-        recent_logs = [
-            row for row in user_daily_logs
-            if datetime.strptime(row[1], '%Y-%m-%d') >= week_ago
-        ]
+def check_summary_header():
+    """
+    Rewrites the summary sheet's header row if it is not SUMMARY_HEADERS,
+    as on a sheet written before the percentile columns were added. The
+    header is read once per process.
+    """
+    if SUMMARY_HEADER_CHECKED.is_set():
+        return
+    rows = summary_sheet.get_rows(1, 1)
+    header = [str(cell) for cell in rows[0]] if rows else []
+    while header and not header[-1]:
+        header.pop()
+    if header != SUMMARY_HEADERS:
+        summary_sheet.update_rows({1: SUMMARY_HEADERS})
+    SUMMARY_HEADER_CHECKED.set()
+
+
+@tracked
+def update_summary(current_user):
+    """
+    Updates the 'summary_sheet' with the past week's data: total sleep
+    hours, feed volume, diaper counts, milestone achievements and the
+    latest growth records. Only the logged-in user and users with new
+    logs are recalculated; their rows are written with a single batch
+    request, and rows for users new to the sheet are appended, so that
+    two processes never pick the same free row. A summary sheet without
+    user rows is rebuilt for every user.
+    """
 
-        # Calculate total sleep and total feed (in ml)
-        total_sleep = sum(
-            float(row[2]) for row in recent_logs if row[2].strip()
-        )
-        total_feed = sum(
-            float(row[3]) for row in recent_logs if row[3].strip()
-        )
-        total_wet_diapers = sum(
-            int(row[4]) for row in recent_logs if row[4].strip()
-        )
-        total_dirty_diapers = sum(
-            int(row[5]) for row in recent_logs if row[5].strip()
-        )
+    print("\n--- LOADING SUMMARY SHEET... ---")
 
-        user_milestones = [
-            row for row in milestone_rows if row[0] == username
-        ]
-        recent_milestones = [
-            row for row in user_milestones
-            if datetime.strptime(row[1], '%Y-%m-%d') >= week_ago
-            and row[2].strip().lower() != "none"
-            and row[2].strip() != ""
-        ]
-        milestones_count = len(recent_milestones)
-
-        user_growth = [row for row in growth_rows if row[0] == username]
-        if user_growth:
-            user_growth.sort(
-                key=lambda x: datetime.strptime(x[1], '%Y-%m-%d'),
-                reverse=True
-            )
-            latest_weight = user_growth[0][2]
-            latest_height = user_growth[0][3]
-        else:
-            latest_weight = ""
-            latest_height = ""
-
-        # Append summary row
-        summary_sheet.append_row([
-            username,
-            round(total_sleep, 2),
-            round(total_feed, 2),
-            milestones_count,
-            latest_weight,
-            latest_height,
-            total_wet_diapers,
-            total_dirty_diapers
-        ])
+    if not SUMMARY_ROWS.has_users():
+        # A rebuild reads the log sheets, so queued rows must land first
+        flush_writes()
+        rebuild_summary()
+    else:
+        check_summary_header()
+        SUMMARY_ENGINE.mark_changed(current_user)
+        rows_by_number = {}
+        new_rows = []
+        for row in SUMMARY_ENGINE.pop_changed():
+            number = SUMMARY_ROWS.row_number(row[0])
+            if number is None:
+                new_rows.append(row)
+            else:
+                rows_by_number[number] = row
+        summary_sheet.update_rows(rows_by_number)
+        if new_rows:
+            summary_sheet.append_rows(new_rows)
+            # The appended rows' numbers are read back on the next update
+            SUMMARY_ROWS.invalidate()
 
     print(
         Fore.GREEN
@@ -725,8 +1209,11 @@ def main_menu(current_user):
     """
     Displays the main menu for returning users after login.
     Allows the user to choose between logging daily data,
-    growth data, milestones, or quitting the app. The selected
+    growth data, milestones, viewing a summary for any period or the
+    weekly trends, or quitting the app. The selected
     option is handled via a loop and passed to the relevant function.
+    Returns True if the session expired and the user must log in again,
+    False when they quit.
     """
     while True:
         print()
@@ -734,25 +1221,45 @@ def main_menu(current_user):
         print("1. Log Daily Baby Data")
         print("2. Log Growth Data")
         print("3. Log Milestones")
-        print("4. Quit")
+        print("4. View Summary for a Period")
+        print("5. View Weekly Trends")
+        print("6. Quit")
 
-        choice = user_input("Enter 1–4", allow_back=False, allow_quit=False)
+        choice = user_input("Enter 1–6", allow_back=False, allow_quit=False)
 
-        if choice == '1':
-            log_daily_baby_data(current_user)
-        elif choice == '2':
-            log_growth_data(current_user)
-        elif choice == '3':
-            log_milestones(current_user)
-        elif choice == '4':
-            print(Fore.BLUE + BOLD + "GOODBYE!" + RESET + Style.RESET_ALL)
-            return  # Exit menu
-        else:
-            print(
-                Fore.RED
-                + "Invalid option. Please enter a number between 1 and 4."
-                + Style.RESET_ALL
-            )
+        # Every action needs a live session, checked locally
+        if choice in ('1', '2', '3', '4', '5') and not is_signed_in(
+            current_user
+        ):
+            session_expired()
+            return True
+
+        try:
+            if choice == '1':
+                log_daily_baby_data(current_user)
+            elif choice == '2':
+                log_growth_data(current_user)
+            elif choice == '3':
+                log_milestones(current_user)
+            elif choice == '4':
+                display_period_summary(current_user)
+            elif choice == '5':
+                display_weekly_trends(current_user)
+            elif choice == '6':
+                print(
+                    Fore.BLUE + BOLD + "GOODBYE!" + RESET + Style.RESET_ALL
+                )
+                return False  # Exit menu
+            else:
+                print(
+                    Fore.RED
+                    + "Invalid option. Please enter a number between 1 "
+                    + "and 6."
+                    + Style.RESET_ALL
+                )
+        except Exception as error:
+            # The menu stays open while the backend cannot be reached
+            report_backend_error(error)
 
 
 def main():
@@ -764,6 +1271,10 @@ def main():
     updates and shows the weekly summary, and opens the main menu.
     """
 
+    # Start connecting to the worksheets while the user reads the menu
+    CONNECTION.start()
+    restore_journal()
+
     print(
         Fore.CYAN
         + "\n" + "_" * 66
@@ -849,9 +1360,12 @@ def main():
         elif choice == '2':
             current_user = login()
             if current_user:
-                show_user_profile(current_user)
-                update_summary()
-                display_user_summary(current_user)
+                try:
+                    show_user_profile(current_user)
+                    update_summary(current_user)
+                    display_user_summary(current_user)
+                except Exception as error:
+                    report_backend_error(error)
                 print(
                     Fore.CYAN
                     + "\n" + "_" * 66
@@ -863,8 +1377,9 @@ def main():
                     + "You may now access the main menu."
                     + Style.RESET_ALL
                 )
-                main_menu(current_user)
-                return
+                if not main_menu(current_user):
+                    return
+                # The session expired: back to the login prompt
 
             else:
                 print(
@@ -890,4 +1405,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Save queued rows even if the session ends unexpectedly
+        flush_writes()
+        if report_requested():
+            print(Fore.CYAN + "\n--- Backend Calls ---" + Style.RESET_ALL)
+            print(RECORDER.report())
+        RECORDER.close()
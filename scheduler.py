@@ -0,0 +1,254 @@
+"""
+Central scheduler for Google Sheets API calls.
+
+Every call to a gspread worksheet goes through one RequestScheduler,
+which:
+
+- spaces calls with a token bucket, so bursts stay under the API quota
+  (BABY_TRACKER_RATE calls per second, default 1, with bursts of up to
+  BABY_TRACKER_BURST calls, default 10);
+- coalesces duplicate reads: a read of the same worksheet range issued
+  while an identical one is in flight waits for that call's result
+  instead of spending another request;
+- retries reads after quota (429) and transient errors, and writes
+  after quota errors only, with jittered exponential backoff, up to
+  BABY_TRACKER_MAX_RETRIES times (default 5), before giving up with the
+  last error.
+
+This is the only place where Sheets calls are retried. A write that
+failed with a server error or a timeout may still have been applied,
+so it is reported to its caller, which decides whether it is safe to
+try again (the journal checks the sheet before replaying). Quota errors
+are returned before the API does anything, so they are always safe to
+retry. is_rejected() tells the errors caused by the data sent, which no
+retry can fix.
+
+Under load this turns quota errors into bounded extra latency instead
+of a crash.
+"""
+
+# Standard libraries
+import os
+import random
+import threading
+import time
+
+# Default scheduler settings
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 10
+
+# Default retry settings
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 32.0
+
+# API status codes worth retrying: quota exceeded and server errors
+RETRYABLE_CODES = (429, 500, 502, 503, 504)
+QUOTA_CODE = 429
+BAD_REQUEST_CODE = 400
+
+# Worksheet methods that only read, and can be coalesced
+READ_METHODS = {
+    "get_all_values", "col_values", "get_rows", "get_columns",
+    "get_row_ranges", "row_exists", "find_rows", "find_row_number",
+    "last_row"
+}
+
+
+def is_retryable(error):
+    """
+    Returns True for quota and transient errors that may succeed later.
+    """
+    # Imported here so that startup does not pay for loading gspread
+    import requests
+    from gspread.exceptions import APIError
+
+    if isinstance(error, APIError):
+        return error.code in RETRYABLE_CODES
+    return isinstance(
+        error, (requests.exceptions.ConnectionError, requests.Timeout)
+    )
+
+
+def is_quota_error(error):
+    """
+    Returns True if the API refused the call for exceeding the quota.
+    """
+    from gspread.exceptions import APIError
+
+    return isinstance(error, APIError) and error.code == QUOTA_CODE
+
+
+def is_rejected(error):
+    """
+    Returns True if the call failed because of the values it sent: the
+    API answered 400 (bad request), or a value could not be encoded.
+    """
+    import requests
+    from gspread.exceptions import APIError
+
+    if isinstance(error, APIError):
+        return error.code == BAD_REQUEST_CODE
+    return isinstance(
+        error, (TypeError, ValueError, requests.exceptions.InvalidJSONError)
+    )
+
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF):
+    """
+    Returns the wait before retry number 'attempt' (starting at 0):
+    exponential with full jitter, capped at MAX_BACKOFF seconds.
+    """
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """
+    Allows 'rate' acquisitions per second on average and up to 'burst'
+    at once. A rate of 0 or less disables the limit.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Wait until a token is available, then take it
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _InFlight:
+    # A read being made on behalf of every caller that asked for it
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestScheduler:
+    """
+    Rate limiting, read coalescing and retries for the calls of one
+    spreadsheet. 'retries' and 'coalesced' count the extra attempts made
+    and the calls saved.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 max_retries=DEFAULT_MAX_RETRIES):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.retries = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_environment(cls):
+        return cls(
+            float(os.environ.get("BABY_TRACKER_RATE", DEFAULT_RATE)),
+            int(os.environ.get("BABY_TRACKER_BURST", DEFAULT_BURST)),
+            int(os.environ.get(
+                "BABY_TRACKER_MAX_RETRIES", DEFAULT_MAX_RETRIES
+            ))
+        )
+
+    def call(self, function, *args, key=None, retry=is_retryable,
+             **kwargs):
+        """
+        Runs function(*args, **kwargs) under the rate limit, retrying
+        the errors for which retry(error) is true: quota and transient
+        errors by default, is_quota_error for writes. Calls given the
+        same hashable 'key' while one is in flight share its result.
+        """
+        if key is None:
+            return self._call_with_retry(function, args, kwargs, retry)
+
+        with self.lock:
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _copy(flight.result)
+
+        try:
+            flight.result = self._call_with_retry(
+                function, args, kwargs, retry
+            )
+            return flight.result
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight.done.set()
+
+    def _call_with_retry(self, function, args, kwargs, retry):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return function(*args, **kwargs)
+            except Exception as error:
+                if attempt == self.max_retries or not retry(error):
+                    raise
+                self.retries += 1
+            time.sleep(backoff_delay(attempt))
+
+
+def _copy(result):
+    # Give each caller its own list of rows
+    if isinstance(result, list):
+        return [list(row) if isinstance(row, list) else row
+                for row in result]
+    return result
+
+
+class ScheduledWorksheet:
+    """
+    Wraps a worksheet so that all of its calls go through a scheduler.
+    Identical concurrent reads are coalesced; writes are only retried
+    after quota errors.
+    """
+
+    def __init__(self, sheet, scheduler):
+        self.sheet = sheet
+        self.title = sheet.title
+        self.scheduler = scheduler
+
+    def __getattr__(self, name):
+        attribute = getattr(self.sheet, name)
+        if not callable(attribute):
+            return attribute
+
+        read = name in READ_METHODS
+        retry = is_retryable if read else is_quota_error
+
+        def scheduled(*args, **kwargs):
+            key = None
+            if read and not kwargs:
+                key = (self.title, name, args)
+            return self.scheduler.call(
+                attribute, *args, key=key, retry=retry, **kwargs
+            )
+        return scheduled
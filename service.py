@@ -0,0 +1,301 @@
+"""
+Service mode: the tracker's operations as a local JSON-over-HTTP API.
+
+Usage:
+    python service.py --host 127.0.0.1 --port 8080
+
+Requests are handled concurrently on a thread per connection. All of
+them share the worksheets, caches, summary engine and journal writer
+set up by run.py, and are validated with the same rules as the prompts.
+
+    POST /register          {"username", "password", "baby_name",
+                             "baby_dob", "birth_weight", "birth_height"
+                             [, "baby_sex"]}
+    POST /login             {"username", "password"}
+    POST /logs/daily_logs   {"token", "log_date", "sleep_hours",
+                             "feed_ml", "wet_diapers", "dirty_diapers"}
+    POST /logs/growth       {"token", "log_date", "weight", "height"}
+    POST /logs/milestones   {"token", "log_date", "milestone"}
+    GET  /profile?token=...
+    GET  /summary?token=...[&from=YYYY-MM-DD&to=YYYY-MM-DD]
+    GET  /trends?token=...[&period=day|week|month]
+
+/register and /login return a session token, which the other requests
+pass as "token" or in an "Authorization: Bearer <token>" header. It
+expires after BABY_TRACKER_SESSION_TTL idle seconds (see auth.py).
+Accounts created before passwords existed must log in once with the app
+to choose a password.
+
+Without from/to the summary covers the last 7 days; either bound can be
+given on its own, and a missing one defaults to the user's first log or
+today. Trends list the user's totals for each day, week (the default) or
+month with logs, oldest first.
+
+Responses are JSON objects. Errors are returned as {"error": message}
+with status 400 (invalid input), 401 (wrong password, or missing or
+expired token), 403 (no password set yet), 404 (unknown user or path)
+or 409 (username taken or log already exists), and any other failure,
+such as worksheets that cannot be reached, with status 500.
+"""
+
+# Standard libraries
+import argparse
+import json
+import traceback
+from datetime import date, datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local modules
+import run
+from instrumentation import RECORDER, operation, report_requested
+from rollups import PERIODS, ROLLUP_HEADERS
+from summary import SUMMARY_HEADERS, summarize_range
+from validation import (
+    DATE_FORMAT, LOG_FIELDS, MIN_PASSWORD_LENGTH, USER_FIELDS, check_user,
+    field_text, is_valid_date, is_valid_password, log_row
+)
+
+# Keys of the user_info columns in profile responses
+PROFILE_FIELDS = [
+    "username", "baby_name", "baby_dob", "age_months",
+    "birth_weight", "birth_height", "baby_sex"
+]
+
+
+class ApiError(Exception):
+    """
+    An error reported to the client with the given HTTP status.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def require_user(params):
+    # Look up the request's user, or fail with 404
+    username = str(params.get("username", "")).strip()
+    if not username:
+        raise ApiError(400, "missing username")
+    row = run.USER_DIRECTORY.get(username)
+    if row is None:
+        raise ApiError(404, "username not found")
+    return username, row
+
+
+def require_session(params):
+    """
+    Looks up the user of the request's session token, or fails with
+    401. The username is taken from the session, never from the request.
+    """
+    token = str(params.get("token", "")).strip()
+    username = run.SESSIONS.user(token) if token else None
+    if username is None:
+        raise ApiError(401, "missing, invalid or expired session token")
+    row = run.USER_DIRECTORY.get(username)
+    if row is None:
+        raise ApiError(404, "username not found")
+    params["username"] = username
+    return username, row
+
+
+def register(params):
+    try:
+        check_user(params)
+    except ValueError as error:
+        raise ApiError(400, str(error))
+    password = str(params.get("password", ""))
+    if not is_valid_password(password):
+        raise ApiError(
+            400, f"password must have at least {MIN_PASSWORD_LENGTH} "
+            "characters"
+        )
+    data = {field: field_text(params, field) for field in USER_FIELDS}
+    data["baby_sex"] = field_text(params, "baby_sex")
+    if not run.save_user(run.new_user_row(data)):
+        raise ApiError(409, "username already taken")
+    if not run.set_password(data["username"], password):
+        raise ApiError(409, "a password is already set for this username")
+    token = run.SESSIONS.start(data["username"])
+    return 201, {"username": data["username"], "token": token}
+
+
+def login(params):
+    username, _ = require_user(params)
+    if run.CREDENTIALS.get(username) is None:
+        raise ApiError(403, "no password set, log in with the app first")
+    if not run.verify_password(username, str(params.get("password", ""))):
+        raise ApiError(401, "wrong password")
+    token = run.SESSIONS.start(username)
+    # Load the user's summary data before the client asks for it
+    run.prefetch_login(username)
+    return 200, {"username": username, "token": token}
+
+
+def save_log(title, params):
+    require_session(params)
+    try:
+        row = log_row(title, params)
+    except ValueError as error:
+        raise ApiError(400, str(error))
+    sheet = run.CONNECTION.worksheet(title)
+    if not run.append_log(sheet, row):
+        raise ApiError(409, f"log for {row[1]} already exists")
+    return 201, dict(zip(LOG_FIELDS[title], row))
+
+
+def profile(params):
+    _, row = require_session(params)
+    return 200, dict(zip(PROFILE_FIELDS, row))
+
+
+def date_param(params, name, default):
+    # Read an optional YYYY-MM-DD parameter as a date ordinal
+    value = str(params.get(name, "")).strip()
+    if not value:
+        return default
+    if not is_valid_date(value):
+        raise ApiError(400, f"invalid {name} date, use YYYY-MM-DD")
+    return datetime.strptime(value, DATE_FORMAT).toordinal()
+
+
+def summary(params):
+    username, row = require_session(params)
+    if "from" in params or "to" in params:
+        return 200, period_summary(username, params, row)
+    values = run.SUMMARY_ENGINE.get(username).as_row()
+    return 200, dict(zip(SUMMARY_HEADERS, values))
+
+
+def period_summary(username, params, user_row=None):
+    start = date_param(params, "from", 1)
+    end = date_param(params, "to", date.today().toordinal())
+    if start > end:
+        raise ApiError(400, "from must not be after to")
+    values = summarize_range(
+        username, run.DATE_INDEXES, start, end, user_row
+    )
+    payload = dict(zip(SUMMARY_HEADERS, values.as_row()))
+    payload["from"] = params.get("from")
+    payload["to"] = date.fromordinal(end).isoformat()
+    return payload
+
+
+def trends(params):
+    username, _ = require_session(params)
+    period = str(params.get("period", "week"))
+    if period not in PERIODS:
+        raise ApiError(400, "period must be day, week or month")
+    rollups = run.ROLLUPS.series(username, period)
+    return 200, {
+        "period": period,
+        "rows": [dict(zip(ROLLUP_HEADERS, rollup.as_row()))
+                 for rollup in rollups]
+    }
+
+
+# Handler of each (method, path)
+ROUTES = {
+    ("POST", "/register"): register,
+    ("POST", "/login"): login,
+    ("GET", "/profile"): profile,
+    ("GET", "/summary"): summary,
+    ("GET", "/trends"): trends,
+}
+for log_title in LOG_FIELDS:
+    ROUTES[("POST", f"/logs/{log_title}")] = partial(save_log, log_title)
+
+
+class TrackerServer(ThreadingHTTPServer):
+    # Many clients may connect at once, so allow a long accept queue
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class TrackerRequestHandler(BaseHTTPRequestHandler):
+    server_version = "SimpleBabyTracker/1.0"
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        params = {
+            key: values[0] for key, values in parse_qs(url.query).items()
+        }
+        try:
+            handler = ROUTES.get((method, url.path))
+            if handler is None:
+                raise ApiError(404, "not found")
+            if method == "POST":
+                params.update(self.read_json())
+            authorization = self.headers.get("Authorization", "")
+            if authorization.startswith("Bearer "):
+                params.setdefault("token", authorization[len("Bearer "):])
+            with operation(f"{method} {url.path}"):
+                status, payload = handler(params)
+        except ApiError as error:
+            status, payload = error.status, {"error": error.message}
+        except Exception as error:
+            # Keep the connection answered when a handler fails
+            self.log_error("%s failed: %r", url.path, error)
+            traceback.print_exc()
+            status, payload = 500, {"error": "internal server error"}
+        self.send_json(status, payload)
+
+    def read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise ApiError(400, "invalid Content-Length header")
+        if length < 0:
+            raise ApiError(400, "invalid Content-Length header")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(400, "request body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "request body must be a JSON object")
+        return body
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve the baby tracker as a local JSON API."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    run.CONNECTION.start()
+    run.restore_journal()
+    server = TrackerServer((args.host, args.port), TrackerRequestHandler)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        run.flush_writes()
+        if report_requested():
+            print(RECORDER.report())
+        RECORDER.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,547 @@
+"""
+Storage backends for Simple Baby Tracker.
+
+Every worksheet used by run.py is wrapped in an object offering the same
+small set of operations: append or update rows, check whether a
+(username, date) log exists, look up one user's rows or the number of
+their first row, read the full range, the first columns, a block of
+rows or several blocks at once, and clear it.
+Two implementations are provided:
+
+- GspreadWorksheet talks to the live Google Sheet (the default).
+- SQLiteWorksheet keeps the same rows in a local, indexed SQLite file so
+  the app can run offline, under load and without creds.json.
+
+The backend is selected with the BABY_TRACKER_BACKEND environment
+variable ('gspread' or 'sqlite'). The SQLite file location is taken from
+BABY_TRACKER_DB. Setting BABY_TRACKER_SHEET_KEY opens the Google Sheet by
+its key, skipping the Drive search by name.
+
+Backend calls are counted and timed when instrumentation is enabled
+(see instrumentation.py).
+
+Nothing is opened at import time: LazyWorksheets connects in a
+background thread when first asked, so the app can start (and this
+module can be imported) without network access or credentials. A failed
+connection is tried again on a later use, after a growing delay.
+"""
+
+# Standard libraries
+import os
+import sqlite3
+import threading
+import time
+
+# Local modules
+from cache import CachedWorksheet, row_ranges
+from instrumentation import instrument
+from scheduler import RequestScheduler, ScheduledWorksheet, is_quota_error
+
+# Required Google API scopes
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Seconds before the first new connection attempt after a failure,
+# doubled after each further failure up to the maximum
+CONNECT_RETRY_DELAY = 1.0
+MAX_CONNECT_RETRY_DELAY = 60.0
+
+# Name of the Google Sheet holding all tracker data
+SPREADSHEET_NAME = 'simple_baby_tracker'
+
+# Header row of every worksheet, in the order run.py writes the columns
+WORKSHEET_HEADERS = {
+    'user_info': [
+        "Username", "Baby Name", "Baby DOB", "Age (months)",
+        "Birth Weight (kg)", "Birth Height (cm)", "Baby Sex"
+    ],
+    'daily_logs': [
+        "Username", "Date", "Sleep (hours)", "Feed (ml)",
+        "Wet Diapers", "Dirty Diapers"
+    ],
+    'growth': ["Username", "Date", "Weight (kg)", "Height (cm)"],
+    'milestones': ["Username", "Date", "Milestone"],
+    'summary': [
+        "Username", "Total Sleep (hrs)", "Total Feed (ml)",
+        "Milestones Achieved", "Latest Weight", "Latest Height",
+        "Total Wet Diapers", "Total Dirty Diapers", "Weight Percentile",
+        "Height Percentile"
+    ],
+    'credentials': ["Username", "Password Hash"],
+}
+
+# Worksheets added to an existing Google Sheet when they are missing
+ADDED_WORKSHEETS = {'credentials'}
+
+# Default backend settings
+DEFAULT_BACKEND = 'gspread'
+DEFAULT_DB_PATH = 'baby_tracker.db'
+
+
+class GspreadWorksheet:
+    """
+    Storage operations backed by a gspread worksheet. The Sheets API
+    cannot filter rows, so lookups read the username and date columns
+    and then fetch only the matching rows.
+    """
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.title = worksheet.title
+
+    def get_all_values(self):
+        return self.worksheet.get_all_values()
+
+    def col_values(self, col):
+        return self.worksheet.col_values(col)
+
+    def get_rows(self, first, last):
+        # Rows first..last (sheet row numbers), fetched as one range
+        return self.worksheet.get_values(f"{first}:{last}")
+
+    def get_columns(self, last):
+        # The first 'last' columns of every row, header included
+        letter = chr(ord("A") + last - 1)
+        return self.worksheet.get_values(f"A:{letter}")
+
+    def get_row_ranges(self, ranges):
+        """
+        Rows of several (first, last) blocks of sheet row numbers, in
+        order, fetched with a single batch request.
+        """
+        if not ranges:
+            return []
+        blocks = self.worksheet.batch_get(
+            [f"{first}:{last}" for first, last in ranges]
+        )
+        return [row for block in blocks for row in block]
+
+    def last_row(self):
+        # Rows in the sheet's grid, blank ones included
+        return self.worksheet.row_count
+
+    def append_row(self, row):
+        self.worksheet.append_row(row)
+
+    def append_rows(self, rows):
+        if rows:
+            self.worksheet.append_rows(rows)
+
+    def update_rows(self, rows_by_number):
+        """
+        Writes rows at the given sheet row numbers in a single request.
+        Consecutive rows are sent together as one range.
+        """
+        if not rows_by_number:
+            return
+        numbers = sorted(rows_by_number)
+        if numbers[-1] > self.worksheet.row_count:
+            self.worksheet.add_rows(numbers[-1] - self.worksheet.row_count)
+
+        ranges = []
+        for number in numbers:
+            if ranges and ranges[-1]['end'] == number - 1:
+                ranges[-1]['values'].append(rows_by_number[number])
+                ranges[-1]['end'] = number
+            else:
+                ranges.append({
+                    'start': number,
+                    'end': number,
+                    'values': [rows_by_number[number]],
+                })
+        self.worksheet.batch_update([
+            {'range': f"A{block['start']}", 'values': block['values']}
+            for block in ranges
+        ])
+
+    def clear(self):
+        self.worksheet.clear()
+
+    def row_exists(self, username, log_date):
+        for row in self.get_columns(2)[1:]:
+            if row[:2] == [username, log_date]:
+                return True
+        return False
+
+    def find_rows(self, username):
+        numbers = [
+            number
+            for number, value in enumerate(self.col_values(1)[1:], start=2)
+            if value == username
+        ]
+        return [
+            row for row in self.get_row_ranges(row_ranges(numbers))
+            if row and row[0] == username
+        ]
+
+    def find_row_number(self, username):
+        # The Sheets API cannot filter rows, so read only the username
+        # column and search it
+        for number, value in enumerate(self.col_values(1)[1:], start=2):
+            if value == username:
+                return number
+        return None
+
+
+class SQLiteWorksheet:
+    """
+    Storage operations backed by a table in a local SQLite database.
+    The table mirrors the sheet layout: the 'row' column is the sheet row
+    number (the header is row 1) and c0, c1, ... hold the cell values as
+    text. An index on (c0, c1) serves the username and date lookups.
+    Worksheets sharing a connection also share a lock, so they can be
+    used from several threads.
+    """
+
+    def __init__(self, connection, title, headers, lock=None):
+        self.connection = connection
+        self.lock = lock or threading.RLock()
+        self.title = title
+        self.table = '"' + title + '"'
+        self.width = 0
+
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(row INTEGER PRIMARY KEY)"
+        )
+        existing = self.connection.execute(
+            f"PRAGMA table_info({self.table})"
+        ).fetchall()
+        self.width = len(existing) - 1
+        self._ensure_width(max(len(headers), 2))
+        self.connection.execute(
+            f'CREATE INDEX IF NOT EXISTS "{title}_user_date" '
+            f"ON {self.table} (c0, c1)"
+        )
+
+        # A fresh table starts with its header row, like a new sheet
+        if self._row_count() == 0:
+            self.append_row(headers)
+
+    def _ensure_width(self, width):
+        # Add text columns until the table can hold 'width' cells per row
+        while self.width < width:
+            self.connection.execute(
+                f"ALTER TABLE {self.table} "
+                f"ADD COLUMN c{self.width} TEXT NOT NULL DEFAULT ''"
+            )
+            self.width += 1
+
+    def _columns(self):
+        return ", ".join(f"c{i}" for i in range(self.width))
+
+    def _cells(self, row, width):
+        # Cell values as text, padded with blanks to 'width' columns
+        return [str(value) for value in row] + [""] * (width - len(row))
+
+    def _row_count(self):
+        return self.connection.execute(
+            f"SELECT COUNT(*) FROM {self.table}"
+        ).fetchone()[0]
+
+    def get_all_values(self):
+        with self.lock:
+            cursor = self.connection.execute(
+                f"SELECT {self._columns()} FROM {self.table} ORDER BY row"
+            )
+            return [list(row) for row in cursor]
+
+    def col_values(self, col):
+        with self.lock:
+            cursor = self.connection.execute(
+                f"SELECT c{col - 1} FROM {self.table} ORDER BY row"
+            )
+            return [row[0] for row in cursor]
+
+    def get_rows(self, first, last):
+        with self.lock:
+            cursor = self.connection.execute(
+                f"SELECT {self._columns()} FROM {self.table} "
+                "WHERE row BETWEEN ? AND ? ORDER BY row",
+                (first, last)
+            )
+            return [list(row) for row in cursor]
+
+    def get_columns(self, last):
+        with self.lock:
+            columns = ", ".join(f"c{i}" for i in range(min(last, self.width)))
+            cursor = self.connection.execute(
+                f"SELECT {columns} FROM {self.table} ORDER BY row"
+            )
+            return [list(row) for row in cursor]
+
+    def last_row(self):
+        with self.lock:
+            return self.connection.execute(
+                f"SELECT COALESCE(MAX(row), 0) FROM {self.table}"
+            ).fetchone()[0]
+
+    def get_row_ranges(self, ranges):
+        if not ranges:
+            return []
+        with self.lock:
+            where = " OR ".join("row BETWEEN ? AND ?" for _ in ranges)
+            cursor = self.connection.execute(
+                f"SELECT {self._columns()} FROM {self.table} "
+                f"WHERE {where} ORDER BY row",
+                [bound for block in ranges for bound in block]
+            )
+            return [list(row) for row in cursor]
+
+    def append_row(self, row):
+        self.append_rows([row])
+
+    def append_rows(self, rows):
+        with self.lock:
+            if not rows:
+                return
+            width = max(len(row) for row in rows)
+            self._ensure_width(width)
+            columns = ", ".join(f"c{i}" for i in range(width))
+            placeholders = ", ".join("?" for _ in range(width))
+            with self.connection:
+                self.connection.executemany(
+                    f"INSERT INTO {self.table} ({columns}) "
+                    f"VALUES ({placeholders})",
+                    [self._cells(row, width) for row in rows]
+                )
+
+    def update_rows(self, rows_by_number):
+        """
+        Writes rows at the given sheet row numbers in one transaction,
+        replacing whatever those rows held before.
+        """
+        with self.lock:
+            if not rows_by_number:
+                return
+            width = max(len(row) for row in rows_by_number.values())
+            self._ensure_width(width)
+            columns = ", ".join(f"c{i}" for i in range(width))
+            placeholders = ", ".join("?" for _ in range(width))
+            with self.connection:
+                self.connection.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (row, {columns}) "
+                    f"VALUES (?, {placeholders})",
+                    [
+                        [number] + self._cells(row, width)
+                        for number, row in rows_by_number.items()
+                    ]
+                )
+
+    def clear(self):
+        with self.lock:
+            with self.connection:
+                self.connection.execute(f"DELETE FROM {self.table}")
+
+    def row_exists(self, username, log_date):
+        with self.lock:
+            cursor = self.connection.execute(
+                f"SELECT 1 FROM {self.table} "
+                "WHERE c0 = ? AND c1 = ? AND row > 1 LIMIT 1",
+                (username, log_date)
+            )
+            return cursor.fetchone() is not None
+
+    def find_rows(self, username):
+        with self.lock:
+            cursor = self.connection.execute(
+                f"SELECT {self._columns()} FROM {self.table} "
+                "WHERE c0 = ? AND row > 1 ORDER BY row",
+                (username,)
+            )
+            return [list(row) for row in cursor]
+
+    def find_row_number(self, username):
+        with self.lock:
+            cursor = self.connection.execute(
+                f"SELECT MIN(row) FROM {self.table} "
+                "WHERE c0 = ? AND row > 1",
+                (username,)
+            )
+            return cursor.fetchone()[0]
+
+
+def open_gspread_worksheets():
+    """
+    Authorizes against Google Sheets with creds.json and returns the
+    tracker worksheets keyed by title. All worksheet handles come from a
+    single metadata fetch; worksheets in ADDED_WORKSHEETS are created if
+    the spreadsheet predates them. Every API call goes through one scheduler
+    (see scheduler.py), and each worksheet is wrapped in a CachedWorksheet
+    so repeated reads within the cache TTL are served from memory.
+    """
+    # Imported here so that startup does not pay for loading gspread
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_file('creds.json')
+    client = gspread.authorize(creds.with_scopes(SCOPE))
+    scheduler = RequestScheduler.from_environment()
+    key = os.environ.get('BABY_TRACKER_SHEET_KEY')
+    if key:
+        spreadsheet = scheduler.call(client.open_by_key, key)
+    else:
+        spreadsheet = scheduler.call(client.open, SPREADSHEET_NAME)
+
+    handles = {}
+    for worksheet in scheduler.call(spreadsheet.worksheets):
+        handles.setdefault(worksheet.title, worksheet)
+    for title in ADDED_WORKSHEETS - set(handles):
+        headers = WORKSHEET_HEADERS[title]
+        handles[title] = scheduler.call(
+            spreadsheet.add_worksheet, title, 1000, len(headers),
+            retry=is_quota_error
+        )
+        scheduler.call(
+            handles[title].append_row, headers, retry=is_quota_error
+        )
+    missing = [title for title in WORKSHEET_HEADERS if title not in handles]
+    if missing:
+        raise gspread.WorksheetNotFound(", ".join(missing))
+    return wrap_gspread_worksheets(handles, scheduler)
+
+
+def wrap_gspread_worksheets(handles, scheduler):
+    """
+    Wraps gspread worksheet handles, keyed by title, for the app: calls
+    are instrumented (when enabled) and scheduled, and reads are cached.
+    """
+    return {
+        title: CachedWorksheet(ScheduledWorksheet(
+            instrument(GspreadWorksheet(handles[title])), scheduler
+        ))
+        for title in WORKSHEET_HEADERS
+    }
+
+
+def open_sqlite_worksheets(path):
+    """
+    Opens (or creates) the SQLite database at 'path' and returns the
+    tracker worksheets keyed by title.
+    """
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    lock = threading.RLock()
+    return {
+        title: instrument(SQLiteWorksheet(connection, title, headers, lock))
+        for title, headers in WORKSHEET_HEADERS.items()
+    }
+
+
+def open_worksheets():
+    """
+    Returns the tracker worksheets for the backend chosen by the
+    BABY_TRACKER_BACKEND environment variable.
+    """
+    backend = os.environ.get('BABY_TRACKER_BACKEND', DEFAULT_BACKEND)
+    if backend == 'gspread':
+        return open_gspread_worksheets()
+    if backend == 'sqlite':
+        return open_sqlite_worksheets(
+            os.environ.get('BABY_TRACKER_DB', DEFAULT_DB_PATH)
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+class LazyWorksheets:
+    """
+    Opens the configured backend in a background thread. start() begins
+    connecting without waiting; worksheet() returns stand-ins that wait
+    for the connection only when they are first used. After a failed
+    connection, uses raise its error until the retry delay has passed,
+    and then connect again.
+    """
+
+    def __init__(self, opener=open_worksheets):
+        self.opener = opener
+        self.worksheets = None
+        self.error = None
+        self.thread = None
+        self.failures = 0
+        self.retry_at = 0
+        self.lock = threading.Lock()
+
+    def _open(self):
+        try:
+            worksheets = self.opener()
+        except Exception as error:
+            with self.lock:
+                delay = min(
+                    MAX_CONNECT_RETRY_DELAY,
+                    CONNECT_RETRY_DELAY * 2 ** self.failures
+                )
+                self.failures += 1
+                self.retry_at = time.monotonic() + delay
+                self.error = error
+        else:
+            with self.lock:
+                self.worksheets = worksheets
+                self.failures = 0
+
+    def start(self):
+        # Returns the connecting thread, starting one if there is none or
+        # the last attempt failed and may be retried
+        with self.lock:
+            retry = self.error is not None and self._may_retry()
+            if self.thread is None or retry:
+                self.error = None
+                self.thread = threading.Thread(
+                    target=self._open, name="sheet-connect", daemon=True
+                )
+                self.thread.start()
+            return self.thread
+
+    def get(self, title):
+        # Wait for the connection, then return the real worksheet
+        while True:
+            self.start().join()
+            with self.lock:
+                if self.worksheets is not None:
+                    return self.worksheets[title]
+                # Otherwise another caller started a new attempt since
+                if self.error is not None and not self._may_retry():
+                    raise self.error
+
+    def _may_retry(self):
+        return time.monotonic() >= self.retry_at
+
+    def worksheet(self, title):
+        return LazyWorksheet(self, title)
+
+
+class LazyWorksheet:
+    """
+    Stand-in for a worksheet that is still being opened. The title is
+    known up front; any other attribute waits for the connection.
+    """
+
+    def __init__(self, connection, title):
+        self.connection = connection
+        self.title = title
+
+    def __getattr__(self, name):
+        return getattr(self.connection.get(self.title), name)
+
+
+def iter_pages(sheet, page_size, first=2):
+    """
+    Yields the rows of a worksheet in blocks of up to 'page_size' rows,
+    starting at sheet row 'first' (after the header by default), so a
+    whole sheet never has to be held in memory. Google Sheets leaves out
+    the trailing blank rows of a range, so a short or empty page does
+    not mean the end of the sheet: pages are read up to its last row,
+    and past it (rows appended since it was counted) until a page comes
+    back empty.
+    """
+    last = sheet.last_row()
+    while True:
+        rows = sheet.get_rows(first, first + page_size - 1)
+        if rows:
+            yield rows
+        elif first > last:
+            return
+        first += page_size
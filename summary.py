@@ -0,0 +1,333 @@
+"""
+Weekly summary calculations for Simple Baby Tracker.
+
+SummaryEngine keeps each user's rolling 7-day totals in memory. A user's
+totals are computed from their day rollups (see rollups.py) the first
+time they are needed (or after the day changes), updated in place as new
+logs are saved, and flagged so that only changed users are written back
+to the summary worksheet. The latest growth entry is also given its
+weight and height percentiles (see percentiles.py); a full rebuild
+scores every growth entry.
+"""
+
+# Standard libraries
+import threading
+from datetime import date
+
+# Local modules
+from percentiles import annotate, annotate_entries, birth_details
+from records import (
+    RECORD_TYPES, DailyLog, GrowthEntry, Milestone, load_records
+)
+from storage import WORKSHEET_HEADERS
+
+# Header row of the summary worksheet
+SUMMARY_HEADERS = WORKSHEET_HEADERS['summary']
+
+# Number of days (including today) covered by a summary
+WINDOW_DAYS = 7
+
+
+def window_start(today=None, window_days=WINDOW_DAYS):
+    """
+    Returns the date ordinal of the first day counted in the summary
+    window ending today.
+    """
+    today = today or date.today()
+    return today.toordinal() - (window_days - 1)
+
+
+def is_milestone(text):
+    # 'None' and blank entries do not count as milestones
+    text = str(text).strip()
+    return text != "" and text.lower() != "none"
+
+
+def _blank_if_none(value):
+    return "" if value is None else value
+
+
+class UserSummary:
+    """
+    Rolling totals for one user over the summary window, built from
+    typed records (see records.py). The window runs from 'start' to
+    'end' (date ordinals, inclusive); an end of None means no limit.
+    """
+
+    def __init__(self, username, start, end=None):
+        self.username = username
+        self.start = start
+        self.end = end
+        self.total_sleep = 0
+        self.total_feed = 0
+        self.total_wet_diapers = 0
+        self.total_dirty_diapers = 0
+        self.milestones_count = 0
+        self.latest_growth = None
+
+    def in_window(self, log_date):
+        return log_date >= self.start and (
+            self.end is None or log_date <= self.end
+        )
+
+    def add_daily(self, log):
+        if not self.in_window(log.log_date):
+            return
+        if log.sleep_hours is not None:
+            self.total_sleep += log.sleep_hours
+        if log.feed_ml is not None:
+            self.total_feed += log.feed_ml
+        if log.wet_diapers is not None:
+            self.total_wet_diapers += log.wet_diapers
+        if log.dirty_diapers is not None:
+            self.total_dirty_diapers += log.dirty_diapers
+
+    def add_milestone(self, milestone):
+        if self.in_window(milestone.log_date) and is_milestone(
+            milestone.milestone
+        ):
+            self.milestones_count += 1
+
+    def add_growth(self, entry):
+        # The earliest row wins a tie, matching the original stable sort
+        if self.end is not None and entry.log_date > self.end:
+            return
+        if (
+            self.latest_growth is None
+            or entry.log_date > self.latest_growth.log_date
+        ):
+            self.latest_growth = entry
+
+    def add_rollup(self, rollup):
+        # Add the totals of a rollups.Rollup lying inside the window
+        self.total_sleep += rollup.sleep_hours
+        self.total_feed += rollup.feed_ml
+        self.total_wet_diapers += rollup.wet_diapers
+        self.total_dirty_diapers += rollup.dirty_diapers
+        self.milestones_count += rollup.milestones
+
+    def as_row(self):
+        latest = self.latest_growth
+        return [
+            self.username,
+            round(self.total_sleep, 2),
+            round(self.total_feed, 2),
+            self.milestones_count,
+            "" if latest is None else _blank_if_none(latest.weight),
+            "" if latest is None else _blank_if_none(latest.height),
+            self.total_wet_diapers,
+            self.total_dirty_diapers,
+            "" if latest is None else _blank_if_none(
+                latest.weight_percentile
+            ),
+            "" if latest is None else _blank_if_none(
+                latest.height_percentile
+            )
+        ]
+
+
+# UserSummary method applying a record of each log worksheet
+RECORDERS = {
+    'daily_logs': UserSummary.add_daily,
+    'milestones': UserSummary.add_milestone,
+    'growth': UserSummary.add_growth,
+}
+
+
+def summarize_records(usernames, daily_logs, milestones, growth, start):
+    """
+    Builds a UserSummary for every username from typed records in a
+    single pass over each list. Records outside the window are skipped
+    before their user is looked up. Returns a dict keyed by username;
+    records of unknown users are ignored.
+    """
+    summaries = {
+        username: UserSummary(username, start) for username in usernames
+    }
+    find = summaries.get
+
+    for log in daily_logs:
+        if log.log_date >= start:
+            summary = find(log.username)
+            if summary is not None:
+                summary.add_daily(log)
+
+    for milestone in milestones:
+        if milestone.log_date >= start:
+            summary = find(milestone.username)
+            if summary is not None:
+                summary.add_milestone(milestone)
+
+    for entry in growth:
+        summary = find(entry.username)
+        if summary is not None:
+            summary.add_growth(entry)
+
+    return summaries
+
+
+def summarize_all(usernames, daily_rows, milestone_rows, growth_rows,
+                  start, births=None):
+    """
+    Converts worksheet rows to typed records once and summarizes them
+    with summarize_records(). Given 'births', a dict of birth_details()
+    by username, every growth entry is scored in one batch.
+    """
+    growth = load_records(GrowthEntry, growth_rows)
+    if births is not None:
+        annotate_entries(growth, births)
+    return summarize_records(
+        usernames,
+        load_records(DailyLog, daily_rows),
+        load_records(Milestone, milestone_rows),
+        growth,
+        start
+    )
+
+
+def summarize_range(username, indexes, start, end, user_row=None):
+    """
+    Builds a UserSummary of the user's logs dated from 'start' to 'end'
+    (date ordinals, inclusive) using the cache.DateRangeIndex of each log
+    worksheet in 'indexes', keyed by title. The latest growth is the
+    latest measurement up to 'end', with percentiles if the user's
+    user_info row is given.
+    """
+    summary = UserSummary(username, start, end)
+    for log in indexes['daily_logs'].between(username, start, end):
+        summary.add_daily(log)
+    for milestone in indexes['milestones'].between(username, start, end):
+        summary.add_milestone(milestone)
+    summary.latest_growth = indexes['growth'].latest(username, end)
+    if user_row is not None:
+        annotate([summary], {username: birth_details(user_row)})
+    return summary
+
+
+class SummaryEngine:
+    """
+    Per-user summaries maintained incrementally. Summaries are computed
+    on demand from the user's day rollups (a rollups.RollupStore) and
+    latest growth entry (a cache.DateRangeIndex of the growth sheet),
+    kept up to date by record() as logs are saved, and recomputed when
+    the day changes. Growth percentiles need the users' user_info rows,
+    looked up in 'users' (a cache.UserDirectory) when given. The engine
+    can be shared between threads; the sheets are read without holding
+    its lock, so record() never waits for a read.
+    """
+
+    def __init__(self, rollups, growth, users=None):
+        self.rollups = rollups
+        self.growth = growth
+        self.users = users
+        self.summaries = {}
+        # Rows recorded per user, to tell whether a summary computed
+        # from the sheets already missed one
+        self.versions = {}
+        self.changed = set()
+        # Users whose latest growth entry is not scored yet
+        self.unscored = set()
+        self.computed_on = None
+        self.lock = threading.RLock()
+
+    def _check_day(self):
+        # A new day moves the window, so every cached total is outdated
+        today = date.today()
+        if self.computed_on != today:
+            self.summaries = {}
+            self.computed_on = today
+
+    def _birth_details(self, summary):
+        # Reads the user's user_info row; call it without holding the lock
+        if self.users is None or summary.latest_growth is None:
+            return None
+        row = self.users.get(summary.username)
+        return None if row is None else birth_details(row)
+
+    def _score(self, summary, details):
+        # Scores the latest growth entry; call it holding the lock
+        if details is not None:
+            annotate([summary], {summary.username: details})
+        self.unscored.discard(summary.username)
+
+    def compute(self, username):
+        """
+        Computes the user's summary from the sheets, without holding the
+        lock, and caches it unless a row of the user was recorded or the
+        day changed meanwhile, in which case it is computed again.
+        """
+        while True:
+            with self.lock:
+                self._check_day()
+                computed_on = self.computed_on
+                version = self.versions.get(username, 0)
+            start = window_start(computed_on)
+            summary = UserSummary(username, start)
+            for rollup in self.rollups.series(username, 'day', start):
+                summary.add_rollup(rollup)
+            summary.latest_growth = self.growth.latest(username)
+            details = self._birth_details(summary)
+            with self.lock:
+                self._check_day()
+                if (
+                    self.computed_on == computed_on
+                    and self.versions.get(username, 0) == version
+                ):
+                    self._score(summary, details)
+                    self.summaries[username] = summary
+                    return summary
+
+    def get(self, username):
+        with self.lock:
+            self._check_day()
+            summary = self.summaries.get(username)
+            if summary is not None and username not in self.unscored:
+                return summary
+        if summary is None:
+            return self.compute(username)
+        details = self._birth_details(summary)
+        with self.lock:
+            self._score(summary, details)
+        return summary
+
+    def load(self, summary):
+        # Seed the engine with a summary already written to the sheet
+        with self.lock:
+            self._check_day()
+            self.summaries[summary.username] = summary
+            self.changed.discard(summary.username)
+
+    def mark_changed(self, username):
+        with self.lock:
+            self.changed.add(username)
+
+    def record(self, title, row):
+        """
+        Applies a new row of the given log worksheet to the rollups and
+        to its user's cached totals, and flags the user as changed. Only
+        memory is updated; a new growth entry is scored by the next
+        get().
+        """
+        record = RECORD_TYPES[title].from_row(row)
+        with self.lock:
+            self._check_day()
+            if title != 'growth':
+                self.rollups.add_row(title, row)
+            self.versions[record.username] = (
+                self.versions.get(record.username, 0) + 1
+            )
+            summary = self.summaries.get(record.username)
+            if summary is not None:
+                RECORDERS[title](summary, record)
+                if title == 'growth':
+                    self.unscored.add(record.username)
+            self.changed.add(record.username)
+
+    def pop_changed(self):
+        """
+        Returns the summary rows of users whose data changed since the
+        last call, and clears the change list.
+        """
+        with self.lock:
+            changed, self.changed = self.changed, set()
+        return [self.get(username).as_row() for username in sorted(changed)]
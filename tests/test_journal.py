@@ -0,0 +1,224 @@
+"""
+Tests of the offline journal: replay idempotency, adoption of journals
+left by ended processes, logging while the sheet is unreachable and
+entries the backend refuses.
+
+Run from the repository root with:
+    python -m unittest discover tests
+"""
+
+# Standard libraries
+import json
+import math
+import os
+import sys
+import tempfile
+import unittest
+
+# The app's modules live in the repository root
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+# Local modules
+from cache import LogIndex  # noqa: E402
+from journal import Journal, JournalWriter  # noqa: E402
+
+
+class FakeSheet:
+    """
+    A log worksheet in memory. Set 'error' to make every call fail, as
+    when the backend cannot be reached.
+    """
+
+    def __init__(self, title, rows=()):
+        self.title = title
+        self.rows = [["Username", "Date"]] + [list(row) for row in rows]
+        self.error = None
+        self.appends = 0
+
+    def get_columns(self, last):
+        if self.error is not None:
+            raise self.error
+        return [row[:last] for row in self.rows]
+
+    def append_rows(self, rows):
+        if self.error is not None:
+            raise self.error
+        # Like the API client, refuse values JSON cannot encode
+        json.dumps(rows, allow_nan=False)
+        self.appends += 1
+        self.rows.extend(list(row) for row in rows)
+
+    def saved(self):
+        return self.rows[1:]
+
+
+class FakeWorksheets:
+    def __init__(self, *sheets):
+        self.sheets = {sheet.title: sheet for sheet in sheets}
+
+    def worksheet(self, title):
+        return self.sheets[title]
+
+
+def write_journal(path, entries, saved=0):
+    # A journal as a process leaves it, with the first 'saved' entries
+    # marked as saved
+    lines = [
+        json.dumps([title, row], separators=(",", ":")) + "\n"
+        for title, row in entries
+    ]
+    with open(path, "w", encoding="utf-8") as file:
+        file.writelines(lines)
+    if saved:
+        with open(path + ".offset", "w", encoding="utf-8") as file:
+            file.write(str(sum(len(line) for line in lines[:saved])))
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "test.journal")
+        self.sheet = FakeSheet("daily_logs")
+        self.worksheets = FakeWorksheets(self.sheet)
+
+    def writer(self):
+        writer = JournalWriter(
+            self.worksheets, self.path, flush_interval=60, retry_interval=60
+        )
+        self.addCleanup(writer.journal.close)
+        return writer
+
+
+class ReplayTest(JournalTestCase):
+    def test_entries_pending_at_startup_are_not_saved_twice(self):
+        # The previous run saved the first row but ended before marking
+        # it saved in the journal
+        self.sheet.rows.append(["amy", "2026-10-01"])
+        write_journal(self.path + ".1", [
+            ("daily_logs", ["amy", "2026-10-01"]),
+            ("daily_logs", ["amy", "2026-10-02"]),
+        ])
+        self.assertEqual(self.writer().flush(), [])
+        self.assertEqual(
+            self.sheet.saved(),
+            [["amy", "2026-10-01"], ["amy", "2026-10-02"]]
+        )
+
+    def test_entry_journaled_twice_is_saved_once(self):
+        # A crash during adoption can copy an entry twice
+        write_journal(self.path + ".1", [
+            ("daily_logs", ["amy", "2026-10-01"]),
+            ("daily_logs", ["amy", "2026-10-01"]),
+        ])
+        self.writer().flush()
+        self.assertEqual(self.sheet.saved(), [["amy", "2026-10-01"]])
+
+    def test_failed_batch_is_checked_before_it_is_saved_again(self):
+        writer = self.writer()
+        self.sheet.error = ConnectionError("offline")
+        writer.append_row(self.sheet, ["amy", "2026-10-01"])
+        waiting = writer.flush()
+        self.assertEqual(
+            waiting[0][:2], ("daily_logs", [["amy", "2026-10-01"]])
+        )
+        # The failed call had reached the sheet after all
+        self.sheet.error = None
+        self.sheet.rows.append(["amy", "2026-10-01"])
+        self.assertEqual(writer.flush(), [])
+        self.assertEqual(self.sheet.saved(), [["amy", "2026-10-01"]])
+
+
+class AdoptTest(JournalTestCase):
+    def test_unsaved_entries_of_an_ended_process_are_saved(self):
+        ended = self.path + ".1"
+        write_journal(ended, [
+            ("daily_logs", ["amy", "2026-10-01"]),
+            ("daily_logs", ["amy", "2026-10-02"]),
+        ], saved=1)
+        writer = self.writer()
+        self.assertFalse(os.path.exists(ended))
+        self.assertFalse(os.path.exists(ended + ".offset"))
+        self.assertEqual(writer.flush(), [])
+        self.assertEqual(self.sheet.saved(), [["amy", "2026-10-02"]])
+
+    def test_journal_of_a_running_process_is_left_alone(self):
+        running = self.path + ".1"
+        write_journal(running, [("daily_logs", ["amy", "2026-10-01"])])
+        journal = Journal(running)
+        self.addCleanup(journal.close)
+        self.writer().flush()
+        self.assertEqual(self.sheet.saved(), [])
+        self.assertEqual(
+            journal.pending(),
+            [(journal.end, "daily_logs", ["amy", "2026-10-01"])]
+        )
+
+
+class OfflineTest(JournalTestCase):
+    def test_logs_are_accepted_and_checked_while_offline(self):
+        index = LogIndex(self.sheet)
+        writer = self.writer()
+        self.sheet.error = ConnectionError("offline")
+        self.assertFalse(index.refresh_if_reachable())
+        self.assertFalse(index.exists("amy", "2026-10-01"))
+        self.assertTrue(index.reserve("amy", "2026-10-01"))
+        writer.append_row(self.sheet, ["amy", "2026-10-01"], verify=True)
+        # A duplicate is refused from the keys already known
+        self.assertFalse(index.reserve("amy", "2026-10-01"))
+        self.assertEqual(
+            writer.pending_rows(), [("daily_logs", ["amy", "2026-10-01"])]
+        )
+        # Meanwhile another terminal saved the same log
+        self.sheet.error = None
+        self.sheet.rows.append(["amy", "2026-10-01"])
+        self.assertEqual(writer.flush(), [])
+        self.assertEqual(self.sheet.saved(), [["amy", "2026-10-01"]])
+
+    def test_rows_checked_online_are_saved_without_a_read(self):
+        writer = self.writer()
+        writer.append_row(self.sheet, ["amy", "2026-10-01"])
+        calls = []
+        self.sheet.get_columns = lambda last: calls.append(last)
+        self.assertEqual(writer.flush(), [])
+        self.assertEqual(calls, [])
+        self.assertEqual(self.sheet.saved(), [["amy", "2026-10-01"]])
+
+
+class RejectedTest(JournalTestCase):
+    def test_refused_entry_is_set_aside(self):
+        writer = self.writer()
+        rows = [
+            ["amy", "2026-10-01", 1.0],
+            ["amy", "2026-10-02", math.nan],
+            ["amy", "2026-10-03", 2.0],
+        ]
+        for row in rows:
+            writer.append_row(self.sheet, row)
+        self.assertEqual(writer.flush(), [])
+        self.assertEqual(self.sheet.saved(), [rows[0], rows[2]])
+        with open(writer.rejected_path, encoding="utf-8") as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual(len(lines), 1)
+        title, row, _ = lines[0]
+        self.assertEqual(title, "daily_logs")
+        self.assertEqual(row[:2], ["amy", "2026-10-02"])
+        self.assertTrue(math.isnan(row[2]))
+
+    def test_entries_after_a_refused_one_are_batched_again(self):
+        writer = self.writer()
+        writer.append_row(self.sheet, ["amy", "2026-10-01", 1.0])
+        writer.append_row(self.sheet, ["amy", "2026-10-02", math.inf])
+        writer.flush()
+        writer.append_row(self.sheet, ["amy", "2026-10-03", 2.0])
+        writer.append_row(self.sheet, ["amy", "2026-10-04", 3.0])
+        appends = self.sheet.appends
+        self.assertEqual(writer.flush(), [])
+        self.assertEqual(self.sheet.appends, appends + 1)
+        self.assertEqual(len(self.sheet.saved()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Input validation rules shared by the interactive prompts in run.py, the
+bulk importer and the service API.
+"""
+
+# Standard libraries
+import math
+from datetime import datetime
+
+# Format of every date entered or stored by the app
+DATE_FORMAT = "%Y-%m-%d"
+
+# Columns of each log worksheet, as named in the log prompts
+LOG_FIELDS = {
+    'daily_logs': [
+        "username", "log_date", "sleep_hours", "feed_ml",
+        "wet_diapers", "dirty_diapers"
+    ],
+    'growth': ["username", "log_date", "weight", "height"],
+    'milestones': ["username", "log_date", "milestone"],
+}
+
+
+def is_valid_date(value):
+    # Dates must match YYYY-MM-DD
+    try:
+        datetime.strptime(value, DATE_FORMAT)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def is_valid_float(value):
+    # "nan" and "inf" parse as floats but cannot be stored in a sheet
+    try:
+        return math.isfinite(float(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def is_valid_int(value):
+    try:
+        int(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+# Accepted answers for a baby's sex, and the value stored for each
+SEXES = {
+    "boy": "boy", "m": "boy", "male": "boy",
+    "girl": "girl", "f": "girl", "female": "girl",
+}
+
+
+def is_valid_sex(value):
+    # The sex is optional; a blank answer skips it
+    value = str(value).strip().lower()
+    return value == "" or value in SEXES
+
+
+# Shortest password accepted at registration
+MIN_PASSWORD_LENGTH = 6
+
+
+def is_valid_password(value):
+    return len(str(value)) >= MIN_PASSWORD_LENGTH
+
+
+def is_valid_milestone(value):
+    # Use 'None' rather than a number when there is no milestone
+    return not str(value).strip().isdigit()
+
+
+def field_text(record, field):
+    """
+    Returns a field of a record as stripped text, "" if it is missing
+    or None (as csv.DictReader gives for a short row). Raises ValueError
+    for a value that is neither text nor a number, such as a list or an
+    object in a JSON request.
+    """
+    value = record.get(field)
+    if value is None:
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"{field} must be text or a number")
+    return str(value).strip()
+
+
+def required_fields(record, fields):
+    # The fields' values as text, failing on the first missing one
+    values = {}
+    for field in fields:
+        values[field] = field_text(record, field)
+        if values[field] == "":
+            raise ValueError(f"missing {field}")
+    return values
+
+
+def log_row(title, record):
+    """
+    Validates a log given as a dict keyed by LOG_FIELDS[title] and returns
+    the worksheet row the prompts would save for it. Raises ValueError
+    describing the first invalid field.
+    """
+    values = required_fields(record, LOG_FIELDS[title])
+    if not is_valid_date(values["log_date"]):
+        raise ValueError("invalid date format, use YYYY-MM-DD")
+
+    row = [values["username"], values["log_date"]]
+    if title == 'daily_logs':
+        for field in ("sleep_hours", "feed_ml"):
+            if not is_valid_float(values[field]):
+                raise ValueError(f"{field} must be a number")
+            row.append(float(values[field]))
+        for field in ("wet_diapers", "dirty_diapers"):
+            if not is_valid_int(values[field]):
+                raise ValueError(f"{field} must be a whole number")
+            row.append(int(values[field]))
+    elif title == 'growth':
+        for field in ("weight", "height"):
+            if not is_valid_float(values[field]):
+                raise ValueError(f"{field} must be a number")
+            row.append(float(values[field]))
+    else:
+        if not is_valid_milestone(values["milestone"]):
+            raise ValueError("milestone cannot be numeric only")
+        row.append(values["milestone"])
+    return row
+
+
+# Fields of a registration, as named in the registration prompts
+USER_FIELDS = [
+    "username", "baby_name", "baby_dob", "birth_weight", "birth_height"
+]
+
+
+def check_user(record):
+    """
+    Validates a registration given as a dict keyed by USER_FIELDS, and
+    optionally baby_sex, with the rules of the registration prompts.
+    Raises ValueError describing the first invalid field. Whether the
+    username is free is not checked.
+    """
+    values = required_fields(record, USER_FIELDS)
+    if not is_valid_date(values["baby_dob"]):
+        raise ValueError("invalid date format, use YYYY-MM-DD")
+    for field in ("birth_weight", "birth_height"):
+        if not is_valid_float(values[field]):
+            raise ValueError(f"{field} must be a number")
+    if not is_valid_sex(field_text(record, "baby_sex")):
+        raise ValueError("baby_sex must be boy or girl")